@@ -0,0 +1,469 @@
+'''@Author: Himaghna
+   Description: single pass reader for Gaussian log files. All quantities needed by Gaussian_tools.Thermochemistry are
+                extracted in one streaming pass so that a log file is read from disk exactly once. The same pass indexes the
+                jobs of the log (--Link1-- jobs and internal job steps such as the freq step of opt freq) with the byte
+                offsets of their route section, optimization steps and frequency/thermochemistry blocks.
+                Compressed logs (.log.gz, .log.bz2, .log.xz and .log.zst with the optional zstandard package) are
+                decompressed as a stream in the same single pass; offsets then refer to the decompressed text'''
+import os
+import re
+import io
+import glob
+import mmap
+try:
+    from . import instrumentation
+    from .thermo_errors import InvalidLogError, InvalidOptionError
+except ImportError:
+    import instrumentation
+    from thermo_errors import InvalidLogError, InvalidOptionError
+
+# patterns are compiled once at import. The cheap substring anchor is checked before the regex is run on a line
+MOLECULAR_MASS_PATTERN = re.compile(r'Molecular mass:(.*)')
+ROTATIONAL_TEMPERATURES_PATTERN = re.compile(r'Rotational temperatures \(Kelvin\)(.*)')
+SYMMETRY_NUMBER_PATTERN = re.compile(r'Rotational symmetry number(.*)')
+ZERO_POINT_ENERGY_PATTERN = re.compile(r'Zero-point vibrational energy(.*?)\(')
+MULTIPLICITY_PATTERN = re.compile(r'Multiplicity(.*)')
+ELECTRONIC_PLUS_ZPE_PATTERN = re.compile(r'Sum of electronic and zero-point Energies=(.*)')
+
+# lines starting a job: the header of every --Link1-- job and every internal job step
+JOB_START_ANCHORS = (b'Entering Gaussian System', b'Link1:  Proceeding to internal job step number')
+# lines recorded in the index of a job
+INDEX_ANCHORS = (b'Step number', b'Harmonic frequencies', b'- Thermochemistry -', b'Normal termination')
+# substrings of lines holding one of the extracted quantities
+QUANTITY_ANCHORS = (b'Frequencies', b'Molecular mass:', b'Rotational temperatures', b'Rotational symmetry number',
+                    b'Zero-point vibrational energy', b'Sum of electronic and zero-point Energies=', b'Multiplicity')
+# every line that parse_line reads holds one of these. The mmap scan searches for the bytes directly and the stream scan
+# tests each line against a single compiled alternation
+ANCHORS = JOB_START_ANCHORS + INDEX_ANCHORS + QUANTITY_ANCHORS
+ANCHOR_PATTERN = re.compile(b'|'.join(re.escape(anchor) for anchor in ANCHORS))
+JOB_START_TEXTS = tuple(anchor.decode() for anchor in JOB_START_ANCHORS)
+# the route section of a job starts with ' #' and runs up to the next line of dashes
+ROUTE_START = b'\n #'
+ROUTE_END = b'\n -'
+FREQUENCY_BLOCK_ANCHOR = b'Harmonic frequencies'
+NORMAL_TERMINATION_ANCHOR = b'Normal termination'
+# the tail scan reads backwards from the end of the log in blocks starting at this size and doubling
+TAIL_BLOCK_SIZE = 1 << 18
+# compressed log extension -> function opening the file for binary reading of the decompressed stream. The decompression
+# modules are imported on first use, which keeps the import of this module cheap for worker processes
+def open_gzip(log_file):
+    import gzip
+    return gzip.open(log_file)
+
+
+def open_bz2(log_file):
+    import bz2
+    return bz2.open(log_file)
+
+
+def open_xz(log_file):
+    import lzma
+    return lzma.open(log_file)
+
+
+def open_zstd(log_file):
+    try:
+        import zstandard
+    except ImportError:
+        raise InvalidLogError(log_file, 'zstandard is required to read zstd compressed logs')
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(log_file, 'rb'), closefd=True))
+
+
+COMPRESSED_LOG_OPENERS = {'.gz': open_gzip, '.bz2': open_bz2, '.xz': open_xz, '.zst': open_zstd}
+LOG_EXTENSIONS = ('.log',) + tuple('.log' + extension for extension in COMPRESSED_LOG_OPENERS)
+
+
+def is_compressed_log(log_file):
+    return os.path.splitext(log_file)[1] in COMPRESSED_LOG_OPENERS
+
+
+def is_log_file(file):
+    return file.endswith(LOG_EXTENSIONS)
+
+
+# log file opened for reading, decompressing on the fly if needed. Binary unless text is True
+def open_log(log_file, text = False):
+    instrumentation.count_file_open(log_file)
+    extension = os.path.splitext(log_file)[1]
+    if extension in COMPRESSED_LOG_OPENERS:
+        fp = COMPRESSED_LOG_OPENERS[extension](log_file)
+    else:
+        fp = open(log_file, 'rb')
+    if text:
+        return io.TextIOWrapper(fp, errors='replace')
+    return fp
+
+
+# plain and compressed log files of a folder, sorted by name
+def get_log_files(folder):
+    return sorted(file for file in glob.glob(os.path.join(folder, '*.log*')) if is_log_file(file))
+
+
+# file name of a log without folder and log extension, e.g. 'folder/CH4.log.gz' -> 'CH4'
+def get_log_name(log_file):
+    name = os.path.basename(log_file)
+    for extension in LOG_EXTENSIONS:
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+# log files are read either line by line ('stream'), memory mapped with a bytes search for the anchors ('mmap') or
+# backwards from the end up to the last complete freq job ('tail', falling back to mmap if that job lacks data)
+SCAN_MODES = ('stream', 'mmap', 'tail')
+
+# offset in window (text at the end of a log, holding the start of the log if at_log_start) of the start of the line
+# opening the last freq job that terminated normally, or None if window does not hold all of such a job
+def get_last_complete_frequency_job_start(window, at_log_start = False):
+    frequency_block = window.rfind(FREQUENCY_BLOCK_ANCHOR)
+    while frequency_block != -1:
+        next_job_starts = [window.find(anchor, frequency_block) for anchor in JOB_START_ANCHORS]
+        job_end = min([position for position in next_job_starts if position != -1] or [len(window)])
+        job_start = max(window.rfind(anchor, 0, frequency_block) for anchor in JOB_START_ANCHORS)
+        if window.find(NORMAL_TERMINATION_ANCHOR, frequency_block, job_end) != -1:
+            if job_start != -1:
+                return window.rfind(b'\n', 0, job_start) + 1
+            # the job starts before the window (or is the implicit first job of a log without header)
+            return 0 if at_log_start else None
+        frequency_block = window.rfind(FREQUENCY_BLOCK_ANCHOR, 0, max(job_start, 0))
+    return None
+
+
+# names of the quantities extracted from a log file
+QUANTITIES = ('amu', 'frequencies_inv_cm', 'rotational_temperatures', 'symmetry_number', 'zero_point_energy',
+              'spin_multiplicity', 'electronic_energy_plus_zpe', 'number_of_imaginary_frequencies')
+# version of the dictionary returned by GaussianLog.to_dict. Stored data of another version must be parsed again
+PARSED_DATA_VERSION = 3
+
+
+class LogJob:
+    # job_data: optional dictionary as returned by to_dict
+    def __init__(self, number = 0, start_offset = 0, job_data = None):
+        self.number = number
+        # byte offsets into the log file. The job runs from start_offset up to (not including) end_offset
+        self.start_offset = start_offset
+        self.end_offset = start_offset
+        self.route = ''
+        self.route_offset = -1
+        self.optimization_step_offsets = []
+        self.frequency_block_offsets = []
+        self.thermochemistry_offsets = []
+        self.normal_termination = False
+        # quantities (see QUANTITIES) at the end of the job. Frequencies are those of this job only, the other quantities
+        # are the last values printed up to the end of the job (e.g. the multiplicity carries over to a freq job step)
+        self.quantities = dict()
+        if job_data is not None:
+            for attribute, value in job_data.items():
+                setattr(self, attribute, value)
+
+    def has_frequencies(self):
+        return bool(self.frequency_block_offsets or self.quantities.get('frequencies_inv_cm'))
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class GaussianLog:
+    # parsed_data: optional dictionary as returned by to_dict (e.g. from a cache). If passed the log file is not read
+    # scan_mode: 'stream', 'mmap' or 'tail'. 'mmap' only decodes the lines holding an anchor and is much faster on large
+    # logs. 'tail' reads the log backwards from its end and only indexes the jobs from the start of the last complete
+    # freq job on (see scan_tail); it is used for job 'last_freq' only, other jobs are found with a full mmap scan.
+    # Compressed logs cannot be memory mapped or read backwards and are always streamed
+    # job: job whose quantities are served, see select_job
+    # log_data: optional bytes of the whole (decompressed) log, already read (e.g. by a log_prefetch.LogPrefetcher). They
+    # are scanned like a memory mapped file whatever the scan_mode and the log file is not opened
+    def __init__(self, log_file, parsed_data = None, scan_mode = 'stream', job = 'last_freq', log_data = None):
+        self.log_file = log_file
+        self.jobs = []
+        self.selected_job = None
+        # byte offset the index of the jobs starts at. Jobs before it (the optimization history skipped by a tail scan)
+        # are not in self.jobs
+        self.index_start_offset = 0
+        self.reset_quantities()
+        if parsed_data is not None:
+            self.jobs = [LogJob(job_data=job_data) for job_data in parsed_data['jobs']]
+            self.index_start_offset = parsed_data.get('index_start_offset', 0)
+        else:
+            if scan_mode not in SCAN_MODES:
+                raise InvalidOptionError('"scan_mode" should be one of {}'.format(SCAN_MODES))
+            try:
+                if log_data is not None:
+                    with instrumentation.stage('parse:buffer'):
+                        self.scan_buffer(log_data)
+                        self.finish(len(log_data))
+                elif scan_mode == 'tail' and job == 'last_freq' and not is_compressed_log(log_file):
+                    with instrumentation.stage('parse:tail'):
+                        self.scan_tail()
+                elif scan_mode in ['mmap', 'tail'] and not is_compressed_log(log_file):
+                    with instrumentation.stage('parse:mmap'):
+                        self.scan_mmap()
+                else:
+                    with instrumentation.stage('parse:stream'):
+                        self.scan_stream()
+            except InvalidLogError:
+                raise
+            except Exception as error:
+                raise InvalidLogError(log_file, 'error opening log file ({})'.format(error)) from error
+        self.select_job(job)
+
+    def reset_quantities(self):
+        # default initializations (same as returned by the Thermochemistry getters if the quantity is absent)
+        self.amu = -1
+        self.frequencies_inv_cm = []
+        self.rotational_temperatures = ''
+        self.symmetry_number = ''
+        self.zero_point_energy = 'NaN'   # J/mol
+        self.spin_multiplicity = ''
+        self.electronic_energy_plus_zpe = 'NaN'   # Hartrees/particle
+        # imaginary frequencies are counted but not kept
+        self.number_of_imaginary_frequencies = 0
+
+    # current values of the quantities. Lists are copied so the dictionary does not change with later lines
+    def get_quantities(self):
+        quantities = dict()
+        for quantity in QUANTITIES:
+            value = getattr(self, quantity)
+            quantities[quantity] = list(value) if isinstance(value, list) else value
+        return quantities
+
+    # serve the quantities of a job: an index into self.jobs (negative counts from the end) or 'last_freq' for the last
+    # job with frequencies that terminated normally (else the last job with frequencies, else the last job)
+    def select_job(self, job = 'last_freq'):
+        if not self.jobs:
+            raise InvalidLogError(self.log_file, 'no Gaussian job found in log file')
+        if self.index_start_offset and job != 'last_freq':
+            raise InvalidOptionError('only the last jobs of log file {} were indexed (tail scan), read it with another '
+                                     'scan mode to select job {}'.format(self.log_file, job))
+        if job == 'last_freq':
+            frequency_jobs = [log_job for log_job in self.jobs if log_job.has_frequencies()]
+            complete_frequency_jobs = [log_job for log_job in frequency_jobs if log_job.normal_termination]
+            selected_job = (complete_frequency_jobs or frequency_jobs or self.jobs)[-1]
+        else:
+            try:
+                selected_job = self.jobs[job]
+            except (IndexError, TypeError):
+                raise InvalidOptionError('log file {} has no job {} (it has {} jobs)'.format(self.log_file, job,
+                                                                                        len(self.jobs)))
+        self.selected_job = selected_job.number
+        self.reset_quantities()
+        for quantity, value in selected_job.quantities.items():
+            setattr(self, quantity, list(value) if isinstance(value, list) else value)
+        return self
+
+    # LogJob of the selected job or of the job with index job
+    def get_job(self, job = None):
+        return self.jobs[self.selected_job if job is None else job]
+
+    # text of the log between two byte offsets (e.g. from the index of a job), read with a single seek. In a compressed
+    # log the seek decompresses (without keeping) everything before start_offset
+    def read_section(self, start_offset, end_offset):
+        with open_log(self.log_file) as fp:
+            if fp.seekable():
+                fp.seek(start_offset)
+            else:
+                # zstandard streams only read forward
+                skipped = 0
+                while skipped < start_offset:
+                    block = fp.read(min(start_offset - skipped, 1 << 20))
+                    if not block:
+                        break
+                    skipped += len(block)
+                instrumentation.count('bytes_read', skipped)
+            section = fp.read(end_offset - start_offset)
+            instrumentation.count('bytes_read', len(section))
+            return section.decode(errors='replace')
+
+    def read_job(self, job = None):
+        log_job = self.get_job(job)
+        return self.read_section(log_job.start_offset, log_job.end_offset)
+
+    def scan_stream(self):
+        offset = 0
+        route_lines = None
+        with open_log(self.log_file) as fp:
+            for line in fp:
+                if route_lines is not None:
+                    # inside a route section
+                    if line.startswith(b' -'):
+                        self.parse_route(b''.join(route_lines).decode(errors='replace'), route_offset)
+                        route_lines = None
+                    else:
+                        route_lines.append(line)
+                elif line.startswith(b' #') and not self.get_current_job(offset).route:
+                    route_lines = [line]
+                    route_offset = offset
+                elif ANCHOR_PATTERN.search(line):
+                    self.parse_line(line.decode(errors='replace'), offset)
+                offset += len(line)
+        instrumentation.count('bytes_read', offset)
+        self.finish(offset)
+
+    # the lines holding any of the ANCHORS and the route sections are found with bytes level searches of the memory
+    # mapped file and only those are decoded, in file order
+    def scan_mmap(self):
+        instrumentation.count_file_open(self.log_file)
+        with open(self.log_file, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                # empty files cannot be memory mapped
+                self.finish(0)
+                return
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+                self.scan_buffer(log_map)
+                instrumentation.count('bytes_read', len(log_map))
+                self.finish(len(log_map))
+
+    # parse the anchor lines and route sections of buffer (bytes or mmap) from its offset start on. base_offset: offset
+    # of the buffer in the log file
+    def scan_buffer(self, buffer, start = 0, base_offset = 0):
+        #line start offset -> line end offset. A line holding several anchors is kept once
+        line_bounds = dict()
+        for anchor in ANCHORS:
+            position = buffer.find(anchor, start)
+            while position != -1:
+                line_start = buffer.rfind(b'\n', 0, position) + 1
+                line_end = buffer.find(b'\n', position)
+                if line_end == -1:
+                    line_end = len(buffer)
+                line_bounds[line_start] = line_end
+                position = buffer.find(anchor, line_end)
+        route_bounds = dict()
+        position = buffer.find(ROUTE_START, start)
+        while position != -1:
+            route_end = buffer.find(ROUTE_END, position + 1)
+            if route_end == -1:
+                route_end = len(buffer)
+            route_bounds[position + 1] = route_end + 1
+            position = buffer.find(ROUTE_START, route_end)
+        for line_start in sorted(set(line_bounds) | set(route_bounds)):
+            if line_start in route_bounds:
+                self.parse_route(buffer[line_start:route_bounds[line_start]].decode(errors='replace'),
+                                 base_offset + line_start)
+            else:
+                self.parse_line(buffer[line_start:line_bounds[line_start]].decode(errors='replace'),
+                                base_offset + line_start)
+
+    # read the log backwards from its end in growing blocks until the window read holds the start of the last freq job
+    # that terminated normally, then index only the jobs from there on. Everything Thermochemistry needs is printed in
+    # that job, so the optimization history before it (most of an opt freq log) is never read. If there is no such job
+    # or a quantity of the selected job is missing from the window (e.g. a multiplicity printed in an earlier job only)
+    # the whole log is scanned instead
+    def scan_tail(self):
+        instrumentation.count_file_open(self.log_file)
+        with open(self.log_file, 'rb') as fp:
+            window_start = os.fstat(fp.fileno()).st_size
+            # blocks read, last first. Joined once per doubling, so the whole file is copied a bounded number of times
+            blocks = []
+            window = b''
+            block_size = TAIL_BLOCK_SIZE
+            job_start = None
+            while window_start > 0 and job_start is None:
+                read_start = max(0, window_start - block_size)
+                fp.seek(read_start)
+                blocks.append(fp.read(window_start - read_start))
+                instrumentation.count('bytes_read', window_start - read_start)
+                window = b''.join(reversed(blocks))
+                window_start = read_start
+                block_size *= 2
+                job_start = get_last_complete_frequency_job_start(window, window_start == 0)
+        if job_start is not None:
+            self.scan_buffer(window, job_start, window_start)
+            self.finish(window_start + len(window))
+            self.index_start_offset = window_start + job_start
+            if self.jobs and self.select_job().has_quantities():
+                return
+        self.jobs = []
+        self.index_start_offset = 0
+        self.reset_quantities()
+        if window_start == 0:
+            # the window already holds the whole log (e.g. no freq job terminated normally): scan it instead of
+            # reading the file again
+            self.scan_buffer(window)
+            self.finish(len(window))
+        else:
+            self.scan_mmap()
+
+    # True if the quantities Thermochemistry always needs were found for the selected job
+    def has_quantities(self):
+        return self.get_job().normal_termination and bool(self.frequencies_inv_cm) and self.amu != -1 and \
+               self.zero_point_energy != 'NaN' and self.electronic_energy_plus_zpe != 'NaN' and \
+               self.spin_multiplicity != ''
+
+    # job being read. Lines before the first job header belong to an implicit first job
+    def get_current_job(self, offset):
+        if not self.jobs:
+            self.jobs.append(LogJob(0, offset))
+        return self.jobs[-1]
+
+    def start_job(self, offset):
+        if self.jobs:
+            self.end_job(offset)
+        self.jobs.append(LogJob(len(self.jobs), offset))
+        # frequencies belong to their job. The other quantities carry over from the previous jobs
+        self.frequencies_inv_cm = []
+        self.number_of_imaginary_frequencies = 0
+
+    def end_job(self, offset):
+        self.jobs[-1].end_offset = offset
+        self.jobs[-1].quantities = self.get_quantities()
+
+    def finish(self, offset):
+        self.get_current_job(0)
+        self.end_job(offset)
+
+    # only the first route section of a job is kept. Its lines are joined without separator since Gaussian wraps the
+    # route at a fixed width
+    def parse_route(self, route_section, offset):
+        job = self.get_current_job(offset)
+        if not job.route:
+            job.route = ''.join(line[1:] for line in route_section.splitlines() if line.strip())
+            job.route_offset = offset
+
+    # update the index and the quantities from a single line starting at byte offset of the log
+    def parse_line(self, line, offset = 0):
+        if any(job_start in line for job_start in JOB_START_TEXTS):
+            self.start_job(offset)
+            return
+        job = self.get_current_job(offset)
+        if 'Step number' in line:
+            job.optimization_step_offsets.append(offset)
+        elif 'Harmonic frequencies' in line:
+            job.frequency_block_offsets.append(offset)
+        elif '- Thermochemistry -' in line:
+            job.thermochemistry_offsets.append(offset)
+        elif 'Normal termination' in line:
+            job.normal_termination = True
+        else:
+            self.parse_quantities(line)
+
+    # update the stored quantities from a single line of the log. Later matches overwrite earlier ones
+    def parse_quantities(self, line):
+        if 'Frequencies' in line:
+            for word in line.split():
+                if not word == "Frequencies" and not word == '--':
+                    if not float(word) < 0:
+                        # not imaginary frequencies
+                        self.frequencies_inv_cm.append(float(word))
+                    else:
+                        self.number_of_imaginary_frequencies += 1
+        elif 'Molecular mass:' in line:
+            self.amu = float(MOLECULAR_MASS_PATTERN.search(line).groups()[0].split()[0])
+        elif 'Rotational temperatures' in line:
+            match = ROTATIONAL_TEMPERATURES_PATTERN.search(line)
+            if match:
+                self.rotational_temperatures = [float(rotational_temperature) for rotational_temperature in
+                                                match.groups()[0].split()]
+        elif 'Rotational symmetry number' in line:
+            self.symmetry_number = float(SYMMETRY_NUMBER_PATTERN.search(line).groups()[0].split()[0])
+        elif 'Zero-point vibrational energy' in line:
+            match = ZERO_POINT_ENERGY_PATTERN.search(line)
+            if match:
+                self.zero_point_energy = float(match.groups()[0])
+        elif 'Sum of electronic and zero-point Energies=' in line:
+            self.electronic_energy_plus_zpe = float(ELECTRONIC_PLUS_ZPE_PATTERN.search(line).groups()[0])
+        if 'Multiplicity' in line:
+            self.spin_multiplicity = float(MULTIPLICITY_PATTERN.search(line).groups()[0].split()[1])
+
+    # index and quantities of every job as a dictionary of plain python values (json serializable)
+    def to_dict(self):
+        return {'version': PARSED_DATA_VERSION, 'jobs': [log_job.to_dict() for log_job in self.jobs],
+                'index_start_offset': self.index_start_offset}
@@ -5,105 +5,241 @@
                [2] Y. P. Li, J. Gomes, S. M. Sharada, A. T. Bell, and M. Head-Gordon, “Improved force-field parameters for QM/MM simulations of the energies of adsorption for molecules in zeolites and a free rotor correction to the rigid rotor harmonic oscillator model for adsorption enthalpies,” J. Phys. Chem. C, vol. 119, no. 4, pp. 1840–1850, 2015.'''
 import sys
 import os
-import constants as c
-import re
+try:
+    from . import constants as c
+    from . import instrumentation
+    from .Gaussian_log import GaussianLog
+    from .thermo_errors import ThermochemistryError, InvalidLogError, MissingDataError, InvalidOptionError
+except ImportError:
+    import constants as c
+    import instrumentation
+    from Gaussian_log import GaussianLog
+    from thermo_errors import ThermochemistryError, InvalidLogError, MissingDataError, InvalidOptionError
 import math
 import numpy as np
 
+QRRHO_CUTOFF_FREQUENCY_INV_CM = 100  # frequency about which the QRRHO weights switch between rotor and oscillator [1]
+AVERAGE_MOMENT_OF_INERTIA = 1e-44  # kg m^2 Average molecular moment of inertia as a limiting value for small moment of inertia [1]
+
+
+# Vectorized terms of the thermochemistry models. The frequency set is held in an ndarray with modes along the last axis and
+# temperature may be a scalar or any array broadcastable against it (e.g. a column of temperatures for a sweep)
+
+def get_vibrational_temperatures_array(frequencies_inv_cm):
+    return np.asarray(frequencies_inv_cm, dtype=float) * c.SPEED_OF_LIGHT_CENTIMETER_PER_SECOND * \
+           c.PLANK_CONSTANT_JOULE_SECOND / c.kBOLTZMANN_JOULE_PER_KELVIN
+
+
+#harmonic oscillator entropy (J/mol/K) and energy (J/mol, zero at bottom of the well, so including ZPE) of every mode
+def get_harmonic_oscillator_terms(vibrational_temperatures, temperature):
+    vibrational_temperatures = np.asarray(vibrational_temperatures, dtype=float)
+    exponential = np.exp(vibrational_temperatures / temperature)
+    entropies = c.R['J/K/mol'] * (vibrational_temperatures / (temperature * (exponential - 1))
+                                  - np.log(1 - np.exp(-vibrational_temperatures / temperature)))
+    energies = c.R['J/K/mol'] * vibrational_temperatures * (0.5 + 1 / (exponential - 1))
+    return entropies, energies
+
+
+#harmonic oscillator heat capacity at constant volume (J/mol/K) of every mode, the temperature derivative of its energy.
+# Written with exp(-theta/T) so that stiff modes go to 0 instead of overflowing
+def get_harmonic_oscillator_heat_capacities(vibrational_temperatures, temperature):
+    reduced_temperatures = np.asarray(vibrational_temperatures, dtype=float) / temperature
+    exponential = np.exp(-reduced_temperatures)
+    return c.R['J/K/mol'] * reduced_temperatures ** 2 * exponential / (1 - exponential) ** 2
+
+
+#harmonic oscillator partition function of every mode with respect to the bottom of the potential well
+def get_harmonic_oscillator_q(vibrational_temperatures, temperature):
+    vibrational_temperatures = np.asarray(vibrational_temperatures, dtype=float)
+    return np.exp(-vibrational_temperatures / (2 * temperature)) / (1 - np.exp(-vibrational_temperatures / temperature))
+
+
+#weights w of the QRRHO model [1] damping low frequency modes from the harmonic oscillator towards the free rotor
+def get_qrrho_weights(frequencies_inv_cm):
+    return 1 / (1 + (QRRHO_CUTOFF_FREQUENCY_INV_CM / np.asarray(frequencies_inv_cm, dtype=float)) ** 4)
+
+
+#entropy (J/mol/K) of a free rotor with the same frequency as every mode [1]
+def get_free_rotor_entropies(frequencies_inv_cm, temperature):
+    frequencies_hertz = np.asarray(frequencies_inv_cm, dtype=float) * c.SPEED_OF_LIGHT_CENTIMETER_PER_SECOND
+    # moment of inertia for a free rotor with the same frequency
+    moments_inertia_free_rotor = c.PLANK_CONSTANT_JOULE_SECOND / (8 * math.pi ** 2 * frequencies_hertz)
+    weighted_moments_inertia = moments_inertia_free_rotor * AVERAGE_MOMENT_OF_INERTIA / \
+                               (moments_inertia_free_rotor + AVERAGE_MOMENT_OF_INERTIA)
+    return c.R['J/K/mol'] * (0.5 + np.log(np.sqrt(8 * weighted_moments_inertia * c.kBOLTZMANN_JOULE_PER_KELVIN *
+                                                  temperature * math.pi ** 3 / c.PLANK_CONSTANT_JOULE_SECOND ** 2)))
+
+
+#molecular partition function for translation of the mobile species (masses in kg) with 1, 2 or 3 degrees of freedom.
+# parameter is the free length (m) for 1D, the free area (m^2) for 2D and the pressure of the gas (Pa) for 3D
+def get_translational_q_array(dimensions, masses_kg, temperature, parameter):
+    translational_q = 1
+    for mass_single_species in masses_kg:
+        if dimensions == 1:
+            translational_q *= np.sqrt(2 * math.pi * mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN *
+                                       temperature / (c.PLANK_CONSTANT_JOULE_SECOND ** 2)) * parameter
+        elif dimensions == 2:
+            translational_q *= 2 * math.pi * mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN * \
+                               temperature / (c.PLANK_CONSTANT_JOULE_SECOND ** 2) * parameter
+        else:
+            translational_q *= (2 * math.pi * mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN
+                                / (c.PLANK_CONSTANT_JOULE_SECOND ** 2)) ** 1.5 \
+                               * (c.kBOLTZMANN_JOULE_PER_KELVIN / parameter) * temperature ** 2.5
+    return translational_q
+
+
+#rigid rotor partition function. General polyatomic molecule with 3 rotational temperatures unless linear
+def get_rotational_q_array(rotational_temperatures, symmetry_number, temperature, linear = False):
+    if not linear:
+        return ((temperature ** 1.5) / symmetry_number) * math.sqrt(math.pi / (rotational_temperatures[0] *
+                                                                             rotational_temperatures[1] * rotational_temperatures[2]))
+    #linear molecule with one rotational temperature
+    return temperature / rotational_temperatures[3] / symmetry_number
+
+
+#QRRHO [1] entropies (J/mol/K) and energies (J/mol) of every mode: weighted average of harmonic oscillator and free rotor
+def get_qrrho_terms(frequencies_inv_cm, temperature):
+    vibrational_entropies, vibrational_energies = get_harmonic_oscillator_terms(
+        get_vibrational_temperatures_array(frequencies_inv_cm), temperature)
+    w = get_qrrho_weights(frequencies_inv_cm)
+    entropies = w * vibrational_entropies + (1 - w) * get_free_rotor_entropies(frequencies_inv_cm, temperature)
+    energies = w * vibrational_energies + (1 - w) * 0.5 * c.R['J/K/mol'] * temperature
+    return entropies, energies
+
+
+#QRRHO [1] heat capacities at constant volume (J/mol/K) of every mode: derivative of the QRRHO energies, the free rotor
+# part (R T / 2) contributing R / 2
+def get_qrrho_heat_capacities(frequencies_inv_cm, temperature):
+    w = get_qrrho_weights(frequencies_inv_cm)
+    return w * get_harmonic_oscillator_heat_capacities(get_vibrational_temperatures_array(frequencies_inv_cm), temperature) \
+           + (1 - w) * 0.5 * c.R['J/K/mol']
+
+
+# raise MissingDataError if a quantity needed for the thermochemistry of log_file is absent. quantities is a GaussianLog or
+# a Thermochemistry (both hold the parsed quantities under the same names). The rotational data is only needed with rotation
+def check_quantities(log_file, quantities, rotation = False):
+    if quantities.electronic_energy_plus_zpe == 'NaN':
+        raise MissingDataError(log_file, 'sum of electronic and zero-point energies')
+    if quantities.zero_point_energy == 'NaN':
+        raise MissingDataError(log_file, 'zero-point vibrational energy')
+    if quantities.spin_multiplicity == '':
+        raise MissingDataError(log_file, 'multiplicity')
+    if len(quantities.frequencies_inv_cm) == 0 and quantities.number_of_imaginary_frequencies > 0:
+        raise MissingDataError(log_file, 'real vibrational frequencies',
+                               'not found in log file (only imaginary frequencies)')
+    if rotation:
+        if len(quantities.rotational_temperatures) < 3:
+            raise MissingDataError(log_file, 'rotational temperatures')
+        if quantities.symmetry_number == '':
+            raise MissingDataError(log_file, 'rotational symmetry number')
+
+
 class Thermochemistry:
-    def __init__(self, log_file, temperature, mass_mobile_species = []):
+    # the quantities needed from the log are copied into slots (frequencies as a float array) and the log itself is not
+    # kept, so that many species can be held in memory. Derived quantities are computed once and cached until the
+    # temperature or the masses of the mobile species are changed
+    __slots__ = ('log_file', 'amu', 'frequencies_inv_cm', 'vibrational_temperatures', 'rotational_temperatures',
+                 'symmetry_number', 'zero_point_energy', 'spin_multiplicity', 'electronic_energy_plus_zpe',
+                 'number_of_imaginary_frequencies', '_temperature', '_mass_mobile_species', '_cache')
+
+    # parsed_log: optional GaussianLog already built for log_file. If not passed, the log file is parsed once here
+    # job: job of the log file to use (see GaussianLog.select_job). Default is the job selected by parsed_log, which is
+    # the last complete job with frequencies unless chosen otherwise
+    @instrumentation.timed('thermochemistry:init')
+    def __init__(self, log_file, temperature, mass_mobile_species = [], parsed_log = None, job = None):
+        self._cache = dict()
         self.temperature = temperature
         if not os.path.isfile(log_file):
-            print("Invalid log file. Exiting")
-            exit(-1)
+            raise InvalidLogError(log_file, 'invalid log file')
         else:
             self.log_file = log_file
+            #all quantities are read from the log file in a single pass
+            if parsed_log is None:
+                parsed_log = GaussianLog(log_file)
+            if job is not None:
+                parsed_log.select_job(job)
+            self.amu = parsed_log.amu
+            self.frequencies_inv_cm = np.array(parsed_log.frequencies_inv_cm, dtype=float)
+            self.frequencies_inv_cm.flags.writeable = False
+            self.vibrational_temperatures = get_vibrational_temperatures_array(self.frequencies_inv_cm)
+            self.vibrational_temperatures.flags.writeable = False
+            self.rotational_temperatures = parsed_log.rotational_temperatures
+            self.symmetry_number = parsed_log.symmetry_number
+            self.zero_point_energy = parsed_log.zero_point_energy
+            self.spin_multiplicity = parsed_log.spin_multiplicity
+            self.electronic_energy_plus_zpe = parsed_log.electronic_energy_plus_zpe
+            self.number_of_imaginary_frequencies = parsed_log.number_of_imaginary_frequencies
             #convert adsorbate masses to kg (from AMU) and store as attribute
             if mass_mobile_species == 'get':
                 # if 'get' passed, get mass of species in amu units from log file. Usually for gas species
+                if self.get_amu() == -1:
+                    raise MissingDataError(log_file, 'molecular mass')
                 self.mass_mobile_species = [c.AMU_TO_KG * self.get_amu()]
             else:
-                if mass_mobile_species:
-                    #if mass_mobile_list is not empty
-                    self.mass_mobile_species = [c.AMU_TO_KG * atomic_mass for atomic_mass in mass_mobile_species]
-        if mass_mobile_species:
-            self.number_of_mobile_species = len(self.mass_mobile_species)
-        else:
-            self.number_of_mobile_species = 0
+                #if mass_mobile_list is not empty
+                self.mass_mobile_species = [c.AMU_TO_KG * atomic_mass for atomic_mass in mass_mobile_species or []]
+
+    # setting the temperature (K) or the masses of the mobile species (kg) clears the cached derived quantities
+    @property
+    def temperature(self):
+        return self._temperature
+
+    @temperature.setter
+    def temperature(self, temperature):
+        self._temperature = temperature
+        self._cache.clear()
+
+    # a tuple, so that the masses only change through the setter, which clears the cache
+    @property
+    def mass_mobile_species(self):
+        return self._mass_mobile_species
+
+    @mass_mobile_species.setter
+    def mass_mobile_species(self, mass_mobile_species):
+        self._mass_mobile_species = tuple(mass_mobile_species)
+        self._cache.clear()
+
+    @property
+    def number_of_mobile_species(self):
+        return len(self._mass_mobile_species)
+
+    # raise MissingDataError if a quantity needed for the thermochemistry (with rotation or not) is absent from the log
+    def check_quantities(self, rotation = False):
+        check_quantities(self.log_file, self, rotation)
+
+    # value of function() cached under key until the temperature or the masses change
+    def get_cached(self, key, function):
+        if key not in self._cache:
+            self._cache[key] = function()
+        return self._cache[key]
 
             #get AMU from logfile
     def get_amu(self):
-        amu = -1  # default initialization
-        try:
+        return self.amu
 
-            with open(self.log_file) as fp:
-                for line in fp:
-                    if re.search('Molecular mass:(.*)',line):
-                        amu = (re.search('Molecular mass:(.*)',line) .groups()[0]).split()
-                        amu = float(amu[0])
-        except:
-            print("Error opening log file.")
-            exit(-1)
-        return amu
 
-
-    # returns the vibrational frequencies as an output list
+    # returns the vibrational frequencies as a read only float ndarray (it was a list): it is shared with the cached
+    # quantities, so modifying it in place raises ValueError. Modify a copy (e.g. frequencies.copy()) instead
     def get_frequencies_inv_cm(self):
-        frequencies = []
-        try:
-            with open(self.log_file) as fp:
-                for line in fp:
-                    if "Frequencies" in line.strip("\n"):
-                        for word in line.split():
-                            if not word == "Frequencies" and not word == '--':
-                                if not float(word)<0 :
-                                    #not imaginary frequencies
-                                    frequencies.append(float(word))
-            return frequencies
-        except:
-            print("Error opening log file.")
-            exit(-1)
+        return self.frequencies_inv_cm
 
     def get_rotational_temperatures(self):
-        try:
-            rotational_temperatures = ''
-            with open(self.log_file) as fp:
-                for line in fp:
-                    if re.search('Rotational temperatures \(Kelvin\)(.*)', line):
-                        rotational_temperatures = (
-                        re.search('Rotational temperatures \(Kelvin\)(.*)', line).groups()[0]).split()
-                        rotational_temperatures = [float(rotational_temperature) for rotational_temperature in
-                                                       rotational_temperatures]
-            return rotational_temperatures
-        except:
-            print("Error opening log file.")
-            exit(-1)
+        return self.rotational_temperatures
 
     def get_symmetry_number(self):
-        try:
-            symmetry_number = ''
-            with open(self.log_file) as fp:
-                for line in fp:
-                    if re.search('Rotational symmetry number(.*)', line):
-                        symmetry_number = (re.search('Rotational symmetry number(.*)', line).groups()[0]).split()
-                        symmetry_number = float(symmetry_number[0])
-            return symmetry_number
-        except:
-            print("Error opening log file.")
-            exit(-1)
+        return self.symmetry_number
 
+    # vibrational temperatures (K) of all real modes as a (read only) ndarray
     def get_vibrational_temperatures(self):
-        return [vibrational_frequency_inv_cm * c.SPEED_OF_LIGHT_CENTIMETER_PER_SECOND * c.PLANK_CONSTANT_JOULE_SECOND/ c.kBOLTZMANN_JOULE_PER_KELVIN
-                                             for vibrational_frequency_inv_cm in self.get_frequencies_inv_cm()]
+        return self.vibrational_temperatures
 
     #get molecular partition function for translation considering 1 degree of freedom with L being length of the free dimension of translation
     def get_translational_q_1D(self, L = 0):
         translational_q_1D = 1
         #if translational degree of freedom (L not =0) or there is at least one mobile species ( or adsorbates)
         if not L == 0 and not self.number_of_mobile_species == 0:
-            for mass_single_species in self.mass_mobile_species:
-                translational_q_1D *= math.sqrt(2 * math.pi * mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN *
-                                                self.temperature /(c.PLANK_CONSTANT_JOULE_SECOND**2)) * L
+            translational_q_1D = self.get_cached(('translational_q', 1, L), lambda: float(
+                get_translational_q_array(1, self.mass_mobile_species, self.temperature, L)))
         return translational_q_1D
 
     # get molecular partition function for translation considering 2 degree of freedom with A being the area of the product of the free dimensions of translation
@@ -111,9 +247,8 @@ class Thermochemistry:
         translational_q_2D = 1
         #if translational degree of freedom (A not =0) or there is at least one mobile species (adsorbates)
         if not A == 0 and not self.number_of_mobile_species == 0:
-            for mass_single_species in self.mass_mobile_species:
-                translational_q_2D *= 2 * math.pi * mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN * \
-                                      self.temperature /(c.PLANK_CONSTANT_JOULE_SECOND**2) * A
+            translational_q_2D = self.get_cached(('translational_q', 2, A), lambda: float(
+                get_translational_q_array(2, self.mass_mobile_species, self.temperature, A)))
         return translational_q_2D
 
     #get molecular partition function for translation considering 3 degrees of freedom with P being pressure of the gas in Pa
@@ -121,68 +256,50 @@ class Thermochemistry:
         translational_q_3D = 1
         #if translational degree of freedom (P not =0) or there is at least one mobile species (adsorbates)
         if not P== 0 and not self.number_of_mobile_species == 0:
-            for mass_single_species in self.mass_mobile_species:
-                translational_q_3D *= (2 * math.pi *mass_single_species * c.kBOLTZMANN_JOULE_PER_KELVIN
-                                                 / (c.PLANK_CONSTANT_JOULE_SECOND**2))**1.5 \
-                                                                                     * (c.kBOLTZMANN_JOULE_PER_KELVIN/P) * self.temperature**2.5
+            translational_q_3D = self.get_cached(('translational_q', 3, P), lambda: float(
+                get_translational_q_array(3, self.mass_mobile_species, self.temperature, P)))
         return translational_q_3D
 
     #get rotational partition function assuming a rigid rotor. if linear molecule, argument linear must be explicitly set to True
     def get_rotational_q(self, linear = False):
         if not isinstance(linear, bool):
-            print('"linear" arguments must be boolean. Exiting')
-            exit(-1)
-        rotational_q = 1
-        rotational_temperatures = self.get_rotational_temperatures()
-        #if general polyatomic molecule with 3 rotational temperature
-        if not linear:
-            rotational_q = ((self.temperature**1.5)/self.get_symmetry_number()) * math.sqrt(math.pi/(rotational_temperatures[0] *
-                                                                                                   rotational_temperatures[1] * rotational_temperatures[2]))
-        #if linear molecule with one rotational temperature
-        else:
-            rotational_q = self.temperature/rotational_temperatures[3] / self.get_symmetry_number()
-        return rotational_q
+            raise InvalidOptionError('"linear" arguments must be boolean')
+        return self.get_cached(('rotational_q', linear), lambda: float(get_rotational_q_array(
+            self.get_rotational_temperatures(), self.get_symmetry_number(), self.temperature, linear=linear)))
 
     #set vibrational partition function assuming harmonic oscillator and with respect to bottom of potential well
     def get_vibrational_q(self):
-        vibrational_q = 1
-        for vibrational_temperature in self.get_vibrational_temperatures():
-            vibrational_q *= math.exp(-vibrational_temperature/(2*self.temperature)) / (1 - math.exp(-vibrational_temperature/self.temperature))
-        return vibrational_q
+        return self.get_cached('vibrational_q', lambda: float(np.prod(get_harmonic_oscillator_q(
+            self.get_vibrational_temperatures(), self.temperature))))
+
+    # vibrational entropy (J/mol/K) and thermal correction (J/mol) summed over the modes, with the QRRHO model or the
+    # harmonic oscillator model
+    @instrumentation.timed('thermochemistry:vibrational_entropy_and_energy')
+    def get_vibrational_entropy_and_energy(self, apply_qrrho = True):
+        if apply_qrrho:
+            # reference #1 entropy for QRRHO model
+            return self.get_cached('qrrho_terms', lambda: tuple(
+                float(np.sum(terms)) for terms in get_qrrho_terms(self.get_frequencies_inv_cm(), self.temperature)))
+        #entropy and thermal corrections for harmonic oscillator model
+        #vibrational energy calculated with zero at BOT. Thus it include ZPE. Do not add it again later.
+        return self.get_cached('harmonic_oscillator_terms', lambda: tuple(
+            float(np.sum(terms)) for terms in get_harmonic_oscillator_terms(self.get_vibrational_temperatures(),
+                                                                             self.temperature)))
 
     #J/mol
     def get_zero_point_energy(self):
-        zero_point_energy = 'NaN'
-        with open(self.log_file) as fp:
-            for line in fp:
-                if re.search('Zero-point vibrational energy(.*?)\(', line):
-                    zero_point_energy = float(re.search('Zero-point vibrational energy(.*?)\(', line).groups()[0])
-        return zero_point_energy
+        return self.zero_point_energy
 
     def get_spin_multiplicity(self):
-        try:
-            spin_multiplicity = ''
-            with open(self.log_file) as fp:
-                for line in fp:
-                    if re.search('Multiplicity(.*)', line):
-                        spin_multiplicity = (re.search('Multiplicity(.*)', line).groups()[0]).split()
-                        spin_multiplicity = float(spin_multiplicity[1])
-            return spin_multiplicity
-        except:
-            print("Error opening log file.")
-            exit(-1)
+        return self.spin_multiplicity
     #electronic partition function = q_electronic
     def get_electronic_q(self):
         return self.get_spin_multiplicity()
 
     #J/mol
     def get_electronic_energy(self):
-        electronic_energy_plus_zpe = 'NaN'
-        with open(self.log_file) as fp:
-            for line in fp:
-                if re.search('Sum of electronic and zero-point Energies=(.*)', line):
-                    #units Hartrees/particle
-                    electronic_energy_plus_zpe = float(re.search('Sum of electronic and zero-point Energies=(.*)', line).groups()[0])
+        #units Hartrees/particle
+        electronic_energy_plus_zpe = self.electronic_energy_plus_zpe
         #converting units to J/mol
         electronic_energy_plus_zpe *=c.HARTREES_TO_JOULES_PER_MOLE
         #electronic_energy = electronic_energy_plus_zpe - zpe
@@ -193,10 +310,11 @@ class Thermochemistry:
     # 3 (3D degrees of freedom translation_parameter is the pressure of the gas species in Pa)
     # return a dictionary of entropy contributions (J/mol/K) and a dictionary of thermal corrections to energy (J/mol)
     # as entropy, thermal_corrections
+    @instrumentation.timed('thermochemistry:entropy_and_thermal_corrections')
     def get_entropy_and_thermal_corrections(self, apply_qrrho = True, rotation = False, translation = 0, translation_parameter = 0):
         if translation not in [0, 1, 2, 3]:
-            print('"translation" should be 0 (none), 1(1D), 2(2D) or 3(3D). Exiting')
-            return 'NaN'
+            raise InvalidOptionError('"translation" should be 0 (none), 1(1D), 2(2D) or 3(3D)')
+        self.check_quantities(rotation)
         entropy = dict()
         energy_thermal_corrections = dict()
         #translational entropy and thermal corrections
@@ -231,49 +349,132 @@ class Thermochemistry:
 
         #vibrational entropy and thermal corrections
 
-        #considering the harmonic oscillator model only
-        vibrational_entropies = [c.R['J/K/mol'] * (vibrational_temperature / (self.temperature * (math.exp(vibrational_temperature / self.temperature) - 1))
-                                                    - math.log(1 - math.exp(-vibrational_temperature / self.temperature)))
-                                                      for vibrational_temperature in self.get_vibrational_temperatures()]
-        #vibrational energy calculated with zero at BOT. Thus it include ZPE. Do not add it again later.
-        vibrational_energies = [c.R['J/K/mol'] * vibrational_temperature * (
-        0.5 + 1 / (math.exp(vibrational_temperature / self.temperature) - 1))
-                                for vibrational_temperature in self.get_vibrational_temperatures()]
+        entropy['vibrational'], energy_thermal_corrections['vibrational'] = \
+            self.get_vibrational_entropy_and_energy(apply_qrrho)
+
+
+        #Correction term due to Sterling's approximation
+        entropy['sterling additive constant'] = c.R['J/K/mol']
 
+
+        return entropy, energy_thermal_corrections
+
+    # dictionary of the contributions (J/mol/K) to the heat capacity at constant volume, the temperature derivatives of the
+    # thermal corrections of get_entropy_and_thermal_corrections with the same options. Closed form, no finite differences
+    @instrumentation.timed('thermochemistry:heat_capacities')
+    def get_heat_capacities(self, apply_qrrho = True, rotation = False, translation = 0):
+        if translation not in [0, 1, 2, 3]:
+            raise InvalidOptionError('"translation" should be 0 (none), 1(1D), 2(2D) or 3(3D)')
+        self.check_quantities(rotation)
+        heat_capacities = dict()
+        #R/2 per translational degree of freedom of every mobile species
+        heat_capacities['translational'] = c.R['J/K/mol'] * self.number_of_mobile_species * 0.5 * translation
+        heat_capacities['electronic'] = 0
+        heat_capacities['rotational'] = c.R['J/K/mol'] * 1.5 if rotation else 0
         if apply_qrrho:
-            # reference #1 entropy for QRRHO model
-            frequencies_inv_cm = self.get_frequencies_inv_cm()
-            frequencies_hertz = [frequency_inv_cm * c.SPEED_OF_LIGHT_CENTIMETER_PER_SECOND for frequency_inv_cm in frequencies_inv_cm]
-            w_list = [1/(1+(100/frequency)**4) for frequency in frequencies_inv_cm ]
-            B_av = 1e-44  # kg m^2 Average molecular moment of inertia as a limiting value for small moment of inertia
-            # moment of inertia for a free rotor with the same frequency
-            moments_inertia_free_rotor = [c.PLANK_CONSTANT_JOULE_SECOND/(8*math.pi**2*frequency) for frequency in frequencies_hertz]
-            weighted_moments_inertia = [moment_inertia_free_rotor*B_av/(moment_inertia_free_rotor+B_av) for moment_inertia_free_rotor in moments_inertia_free_rotor]
-            low_frequency_entropies = [c.R['J/K/mol'] *
-                                     (0.5 + math.log(math.sqrt(8 * moment_inertia * c.kBOLTZMANN_JOULE_PER_KELVIN * self.temperature * math.pi**3/c.PLANK_CONSTANT_JOULE_SECOND**2)))
-                                     for moment_inertia in weighted_moments_inertia]
-
-            corrected_vibrational_entropies = [w * vibrational_entropy + (1-w) * low_frequency_entropy
-                                     for w, vibrational_entropy, low_frequency_entropy in zip(w_list, vibrational_entropies, low_frequency_entropies)]
-            corrected_vibrational_energies = [w * vibrational_energy + (1 - w) * 0.5 * c.R['J/K/mol'] * self.temperature
-                                              for w, vibrational_energy in zip(w_list, vibrational_energies)]
+            heat_capacities['vibrational'] = self.get_cached('qrrho_heat_capacity', lambda: float(np.sum(
+                get_qrrho_heat_capacities(self.get_frequencies_inv_cm(), self.temperature))))
         else:
-            #entropy and thermal corrections for harmonic oscillator model
-            corrected_vibrational_entropies = vibrational_entropies
-            corrected_vibrational_energies = vibrational_energies
+            heat_capacities['vibrational'] = self.get_cached('harmonic_oscillator_heat_capacity', lambda: float(np.sum(
+                get_harmonic_oscillator_heat_capacities(self.get_vibrational_temperatures(), self.temperature))))
+        return heat_capacities
 
+    #heat capacity at constant pressure (J/mol/K) from the contributions of get_heat_capacities. Cp = Cv + R when H = U + RT
+    def get_heat_capacity_cp(self, heat_capacities):
+        heat_capacity_cv = sum([heat_capacities[key] for key in heat_capacities])
+        if self.number_of_mobile_species == 0:
+            # if species is adsorbed (no mobile species) then U = H
+            return heat_capacity_cv
+        return heat_capacity_cv + c.R['J/K/mol']
+
+    # evaluate the contributions of get_entropy_and_thermal_corrections and get_heat_capacities and the energies of
+    # get_energies over a grid of temperatures (K) and pressures (Pa) from the single parse of the log file. The pressure is
+    # the translation_parameter for 3D translation and is ignored otherwise. Returns a dictionary with the grid axes and,
+    # under 'entropy' (J/mol/K), 'energy_thermal_corrections' (J/mol), 'heat_capacities' (J/mol/K) and 'energies' (J/mol,
+    # also holding the total entropy and the heat capacities 'heat_capacity_cv' and 'heat_capacity_cp' in J/mol/K), 2-D
+    # arrays of shape (len(temperatures), len(pressures))
+    @instrumentation.timed('thermochemistry:sweep')
+    def get_thermochemistry_sweep(self, temperatures, pressures = (c.ATM_TO_PASCAL,), apply_qrrho = True, rotation = False,
+                                  translation = 0, translation_parameter = 0):
+        if translation not in [0, 1, 2, 3]:
+            raise InvalidOptionError('"translation" should be 0 (none), 1(1D), 2(2D) or 3(3D)')
+        self.check_quantities(rotation)
+        temperature_axis = np.asarray(temperatures, dtype=float).ravel()
+        pressure_axis = np.asarray(pressures, dtype=float).ravel()
+        #temperatures down the rows and pressures along the columns of every table
+        temperature_grid = temperature_axis[:, np.newaxis]
+        pressure_grid = pressure_axis[np.newaxis, :]
+        shape = (temperature_axis.size, pressure_axis.size)
+        entropy = dict()
+        energy_thermal_corrections = dict()
+        heat_capacities = dict()
 
-        entropy['vibrational'] = sum(corrected_vibrational_entropies)
-        energy_thermal_corrections['vibrational'] = sum(corrected_vibrational_energies)
+        #translational entropy and thermal corrections
+        dimension_factor = {0: 0, 1: 0.5, 2: 1, 3: 1.5}[translation] * self.number_of_mobile_species
+        if translation == 0:
+            entropy['translational'] = np.zeros(shape)
+        elif self.number_of_mobile_species == 0 or (translation < 3 and translation_parameter == 0):
+            #partition function is 1
+            entropy['translational'] = np.full(shape, c.R['J/K/mol'] * dimension_factor)
+        else:
+            parameter = pressure_grid if translation == 3 else translation_parameter
+            translational_q = get_translational_q_array(translation, self.mass_mobile_species, temperature_grid, parameter)
+            entropy['translational'] = np.broadcast_to(c.R['J/K/mol'] * (np.log(translational_q) + dimension_factor), shape)
+        energy_thermal_corrections['translational'] = np.broadcast_to(
+            c.R['J/K/mol'] * temperature_grid * dimension_factor, shape)
+        heat_capacities['translational'] = np.full(shape, c.R['J/K/mol'] * dimension_factor)
 
+        entropy['electronic'] = np.full(shape, math.log(self.get_electronic_q()))
+        heat_capacities['electronic'] = np.zeros(shape)
 
-        #Correction term due to Sterling's approximation
-        entropy['sterling additive constant'] = c.R['J/K/mol']
+        #rotational entropy and thermal corrections
+        if not rotation:
+            entropy['rotational'] = np.zeros(shape)
+            energy_thermal_corrections['rotational'] = np.zeros(shape)
+            heat_capacities['rotational'] = np.zeros(shape)
+        else:
+            rotational_q = get_rotational_q_array(self.get_rotational_temperatures(), self.get_symmetry_number(),
+                                                  temperature_grid, linear=False)
+            entropy['rotational'] = np.broadcast_to(c.R['J/K/mol'] * (np.log(rotational_q) + 1.5), shape)
+            energy_thermal_corrections['rotational'] = np.broadcast_to(c.R['J/K/mol'] * temperature_grid * 1.5, shape)
+            heat_capacities['rotational'] = np.full(shape, c.R['J/K/mol'] * 1.5)
 
+        #vibrational entropy and thermal corrections, modes along the last axis
+        if apply_qrrho:
+            vibrational_entropies, vibrational_energies = get_qrrho_terms(self.get_frequencies_inv_cm(), temperature_grid)
+            vibrational_heat_capacities = get_qrrho_heat_capacities(self.get_frequencies_inv_cm(), temperature_grid)
+        else:
+            vibrational_entropies, vibrational_energies = get_harmonic_oscillator_terms(
+                self.get_vibrational_temperatures(), temperature_grid)
+            vibrational_heat_capacities = get_harmonic_oscillator_heat_capacities(self.get_vibrational_temperatures(),
+                                                                                  temperature_grid)
+        entropy['vibrational'] = np.broadcast_to(np.sum(vibrational_entropies, axis=-1)[:, np.newaxis], shape)
+        energy_thermal_corrections['vibrational'] = np.broadcast_to(
+            np.sum(vibrational_energies, axis=-1)[:, np.newaxis], shape)
+        heat_capacities['vibrational'] = np.broadcast_to(np.sum(vibrational_heat_capacities, axis=-1)[:, np.newaxis], shape)
 
-        return entropy, energy_thermal_corrections
+        #Correction term due to Sterling's approximation
+        entropy['sterling additive constant'] = np.full(shape, c.R['J/K/mol'])
+
+        energies = dict()
+        energies['electronic_energy'] = np.full(shape, self.get_electronic_energy())
+        energies['internal_energy'] = energies['electronic_energy'] + sum(energy_thermal_corrections.values())
+        if self.number_of_mobile_species == 0:
+            # if species is adsorbed (no mobile species) then U = H
+            energies['enthalpy'] = energies['internal_energy']
+        else:
+            energies['enthalpy'] = energies['internal_energy'] + c.R['J/K/mol'] * temperature_grid
+        energies['entropy'] = sum(entropy.values())
+        energies['heat_capacity_cv'] = sum(heat_capacities.values())
+        energies['heat_capacity_cp'] = energies['heat_capacity_cv'] + (0 if self.number_of_mobile_species == 0 else
+                                                                       c.R['J/K/mol'])
+        energies['gibbs_free_energy'] = energies['enthalpy'] - temperature_grid * energies['entropy']
+        return {'temperatures': temperature_axis, 'pressures': pressure_axis, 'entropy': entropy,
+                'energy_thermal_corrections': energy_thermal_corrections, 'heat_capacities': heat_capacities,
+                'energies': energies}
 
     #all in J/mol
+    @instrumentation.timed('thermochemistry:energies')
     def get_energies(self, entropy, energy_thermal_corrections):
         energies = dict()
         total_thermal_corrections_energy = sum([energy_thermal_corrections[key] for key in energy_thermal_corrections])
@@ -288,6 +489,167 @@ class Thermochemistry:
         return energies
 
 
+# converts a quantity read from a log file to float. Missing quantities ('' or 'NaN' defaults of GaussianLog) become nan
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class ThermochemistryBatch:
+    # thermochemistry of many species at one temperature (or a 1-D array of temperatures), evaluated as a structure of
+    # arrays: the frequencies of all species are packed into a (number of species, largest number of modes) array padded
+    # with nan and every other property is an array over species. parsed_logs is a list of GaussianLog,
+    # masses_mobile_species a list with one entry per species as for the mass_mobile_species argument of Thermochemistry
+    # ('get' or a list of amu) and arguments a list of dictionaries of the arguments of
+    # Thermochemistry.get_entropy_and_thermal_corrections (as built by get_thermo_gaussian.build_argument).
+    # Missing or invalid data of a species gives nan results for that species only and its ThermochemistryError in
+    # self.errors (None for valid species).
+    # With an array of temperatures every result is an array of shape (number of temperatures, number of species)
+    @instrumentation.timed('batch:init')
+    def __init__(self, parsed_logs, temperature, masses_mobile_species, arguments):
+        self.temperature = temperature
+        #temperatures down the rows, species along the columns of the results
+        self.temperature_grid = np.asarray(temperature, dtype=float)
+        if self.temperature_grid.ndim == 1:
+            self.temperature_grid = self.temperature_grid[:, np.newaxis]
+        self.number_of_species = len(parsed_logs)
+        number_of_modes = max([len(parsed_log.frequencies_inv_cm) for parsed_log in parsed_logs] + [0])
+        self.frequencies_inv_cm = np.full((self.number_of_species, number_of_modes), np.nan)
+        for index, parsed_log in enumerate(parsed_logs):
+            self.frequencies_inv_cm[index, :len(parsed_log.frequencies_inv_cm)] = parsed_log.frequencies_inv_cm
+        self.mode_mask = ~np.isnan(self.frequencies_inv_cm)
+        self.symmetry_numbers = np.array([to_float(parsed_log.symmetry_number) for parsed_log in parsed_logs])
+        #product of the three rotational temperatures of a general polyatomic molecule
+        self.rotational_temperatures_products = np.array(
+            [np.prod([to_float(rotational_temperature) for rotational_temperature in parsed_log.rotational_temperatures[:3]])
+             if len(parsed_log.rotational_temperatures) >= 3 else np.nan for parsed_log in parsed_logs])
+        self.spin_multiplicities = np.array([to_float(parsed_log.spin_multiplicity) for parsed_log in parsed_logs])
+        #J/mol
+        self.zero_point_energies = np.array([to_float(parsed_log.zero_point_energy) for parsed_log in parsed_logs])
+        self.electronic_energies = np.array([to_float(parsed_log.electronic_energy_plus_zpe) for parsed_log in parsed_logs]) \
+                                   * c.HARTREES_TO_JOULES_PER_MOLE - self.zero_point_energies
+        #the translational partition function of the mobile species only depends on their masses through the sum of
+        # log(2 pi m kB / h^2) over the mobile species
+        self.number_of_mobile_species = np.zeros(self.number_of_species)
+        self.sum_log_mass_terms = np.zeros(self.number_of_species)
+        for index, (parsed_log, mass_mobile_species) in enumerate(zip(parsed_logs, masses_mobile_species)):
+            if mass_mobile_species == 'get':
+                mass_mobile_species = [to_float(parsed_log.amu)]
+            masses_kg = c.AMU_TO_KG * np.array(mass_mobile_species or [], dtype=float)
+            self.number_of_mobile_species[index] = masses_kg.size
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.sum_log_mass_terms[index] = np.sum(np.log(2 * math.pi * masses_kg * c.kBOLTZMANN_JOULE_PER_KELVIN /
+                                                               c.PLANK_CONSTANT_JOULE_SECOND ** 2))
+        self.apply_qrrho = np.array([argument.get('apply_qrrho', True) for argument in arguments], dtype=bool)
+        self.rotation = np.array([argument.get('rotation', False) for argument in arguments], dtype=bool)
+        self.translation = np.array([argument.get('translation', 0) for argument in arguments], dtype=int)
+        self.translation_parameters = np.array([to_float(argument.get('translation_parameter', 0)) or 0
+                                                for argument in arguments])
+        self.errors = [self.get_error(parsed_log, mass_mobile_species, argument) for parsed_log, mass_mobile_species,
+                       argument in zip(parsed_logs, masses_mobile_species, arguments)]
+        invalid_species = np.array([error is not None for error in self.errors], dtype=bool)
+        self.translation[invalid_species] = 0
+        self.electronic_energies[invalid_species] = np.nan
+
+    # ThermochemistryError that Thermochemistry would raise for a species, or None
+    @staticmethod
+    def get_error(parsed_log, mass_mobile_species, argument):
+        try:
+            if argument.get('translation', 0) not in [0, 1, 2, 3]:
+                raise InvalidOptionError('"translation" should be 0 (none), 1(1D), 2(2D) or 3(3D)')
+            if mass_mobile_species == 'get' and parsed_log.amu == -1:
+                raise MissingDataError(parsed_log.log_file, 'molecular mass')
+            check_quantities(parsed_log.log_file, parsed_log, argument.get('rotation', False))
+        except ThermochemistryError as error:
+            return error
+        return None
+
+    # dictionaries of arrays over species of the entropy contributions (J/mol/K) and thermal corrections (J/mol), as
+    # returned by Thermochemistry.get_entropy_and_thermal_corrections for every species
+    @instrumentation.timed('batch:entropy_and_thermal_corrections')
+    def get_entropy_and_thermal_corrections(self):
+        entropy = dict()
+        energy_thermal_corrections = dict()
+        R = c.R['J/K/mol']
+        temperature = self.temperature_grid
+        shape = np.broadcast(temperature, self.symmetry_numbers).shape
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            #translational entropy and thermal corrections
+            dimension_factors = np.array([0, 0.5, 1, 1.5])[self.translation] * self.number_of_mobile_species
+            #free length (1D), free area (2D) or volume kB T/P (3D) per mobile species
+            parameter_terms = np.where(self.translation == 3, c.kBOLTZMANN_JOULE_PER_KELVIN * temperature /
+                                       self.translation_parameters, self.translation_parameters)
+            log_translational_q = self.translation / 2 * (self.sum_log_mass_terms + self.number_of_mobile_species *
+                                                          np.log(temperature)) \
+                                  + self.number_of_mobile_species * np.log(parameter_terms)
+            #partition function is 1 without translational degree of freedom (parameter 0) or mobile species
+            log_translational_q = np.where((self.translation_parameters == 0) | (self.number_of_mobile_species == 0), 0,
+                                           log_translational_q)
+            entropy['translational'] = np.where(self.translation == 0, 0, R * (log_translational_q + dimension_factors))
+            energy_thermal_corrections['translational'] = np.broadcast_to(R * temperature * dimension_factors, shape)
+
+            entropy['electronic'] = np.broadcast_to(np.log(self.spin_multiplicities), shape)
+
+            #rotational entropy and thermal corrections of general polyatomic molecules
+            rotational_q = temperature ** 1.5 / self.symmetry_numbers * np.sqrt(math.pi / self.rotational_temperatures_products)
+            entropy['rotational'] = np.where(self.rotation, R * (np.log(rotational_q) + 1.5), 0)
+            energy_thermal_corrections['rotational'] = np.where(self.rotation, R * temperature * 1.5, 0)
+
+            #vibrational entropy and thermal corrections, modes along the last axis. Padding modes are masked out of the sums
+            mode_temperature = temperature[..., np.newaxis]
+            harmonic_entropies, harmonic_energies = get_harmonic_oscillator_terms(
+                get_vibrational_temperatures_array(self.frequencies_inv_cm), mode_temperature)
+            qrrho_entropies, qrrho_energies = get_qrrho_terms(self.frequencies_inv_cm, mode_temperature)
+            apply_qrrho = self.apply_qrrho[:, np.newaxis]
+            entropy['vibrational'] = np.sum(np.where(self.mode_mask, np.where(apply_qrrho, qrrho_entropies,
+                                                                              harmonic_entropies), 0), axis=-1)
+            energy_thermal_corrections['vibrational'] = np.sum(np.where(self.mode_mask, np.where(
+                apply_qrrho, qrrho_energies, harmonic_energies), 0), axis=-1)
+
+        #Correction term due to Sterling's approximation
+        entropy['sterling additive constant'] = np.full(shape, R)
+        return entropy, energy_thermal_corrections
+
+    # dictionary of arrays over species of the contributions to the heat capacity at constant volume (J/mol/K), as returned
+    # by Thermochemistry.get_heat_capacities for every species
+    @instrumentation.timed('batch:heat_capacities')
+    def get_heat_capacities(self):
+        heat_capacities = dict()
+        R = c.R['J/K/mol']
+        shape = np.broadcast(self.temperature_grid, self.symmetry_numbers).shape
+        heat_capacities['translational'] = np.broadcast_to(R * 0.5 * self.translation * self.number_of_mobile_species,
+                                                           shape)
+        heat_capacities['electronic'] = np.zeros(shape)
+        heat_capacities['rotational'] = np.broadcast_to(np.where(self.rotation, R * 1.5, 0), shape)
+        mode_temperature = self.temperature_grid[..., np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            harmonic_heat_capacities = get_harmonic_oscillator_heat_capacities(
+                get_vibrational_temperatures_array(self.frequencies_inv_cm), mode_temperature)
+            qrrho_heat_capacities = get_qrrho_heat_capacities(self.frequencies_inv_cm, mode_temperature)
+        heat_capacities['vibrational'] = np.sum(np.where(self.mode_mask, np.where(
+            self.apply_qrrho[:, np.newaxis], qrrho_heat_capacities, harmonic_heat_capacities), 0), axis=-1)
+        return heat_capacities
+
+    #heat capacity at constant pressure (J/mol/K), arrays over species. Cp = Cv + R for species with H = U + RT
+    def get_heat_capacity_cp(self, heat_capacities):
+        return sum(heat_capacities.values()) + np.where(self.number_of_mobile_species == 0, 0, c.R['J/K/mol'])
+
+    #all in J/mol, arrays over species
+    @instrumentation.timed('batch:energies')
+    def get_energies(self, entropy, energy_thermal_corrections):
+        energies = dict()
+        energies['electronic_energy'] = np.broadcast_to(self.electronic_energies, np.broadcast(
+            self.temperature_grid, self.electronic_energies).shape)
+        energies['internal_energy'] = energies['electronic_energy'] + sum(energy_thermal_corrections.values())
+        # if species is adsorbed (no mobile species) then U = H
+        energies['enthalpy'] = energies['internal_energy'] + np.where(self.number_of_mobile_species == 0, 0,
+                                                                      c.R['J/K/mol'] * self.temperature_grid)
+        energies['gibbs_free_energy'] = energies['enthalpy'] - self.temperature_grid * sum(entropy.values())
+        return energies
+
+
 
 
 
@@ -3,26 +3,17 @@
    Date: March 18th 2018
    Description: collection of statistical tools '''
 
-import numpy as np
-import xlsxwriter
 import os
-import sys
+import argparse
 
 #takes in a text file containing many columns and converts into XL file with the format of each cell as cell_format int/str/float (default is float)
+#an input file that cannot be opened raises OSError
 def create_xl(input_filename, output_filename, cell_format = 'float'):
-    try:
-        input_fp = open(input_filename, 'r')
-    except:
-        print('Error opening input file. Exiting')
-        sys.exit(-1)
-
-    try:
-        workbook = xlsxwriter.Workbook(output_filename)
-        worksheet = workbook.add_worksheet()
-
-    except:
-        print('Error with opening output file. Exiting')
-        exit()
+    import xlsxwriter
+    input_fp = open(input_filename, 'r')
+    # constant_memory: rows are flushed to disk as they are written instead of held until close
+    workbook = xlsxwriter.Workbook(output_filename, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
     #index of row being written
     row_number = 0
     for line in input_fp:
@@ -44,6 +35,20 @@ def create_xl(input_filename, output_filename, cell_format = 'float'):
     input_fp.close()
 
 
-create_xl('/Users/Ne0/Documents/Prof/Acads/1-2/Math/HW/HW3_Stats/14_37.txt', '/Users/Ne0/Documents/Prof/Acads/1-2/Math/HW/HW3_Stats/14_37.xlsx')
+def main():
+    parser = argparse.ArgumentParser(description='Convert a text file of space separated columns to an Excel file')
+    parser.add_argument('input_filename', help='Text file to convert')
+    parser.add_argument('output_filename', nargs='?', default=None,
+                        help='Excel file to write (default: the input file with the extension .xlsx)')
+    parser.add_argument('-f', '--cell-format', choices=('float', 'int', 'str'), default='float',
+                        help='Format of every cell')
+    command_args = parser.parse_args()
+    output_filename = command_args.output_filename or os.path.splitext(command_args.input_filename)[0] + '.xlsx'
+    try:
+        create_xl(command_args.input_filename, output_filename, command_args.cell_format)
+    except (ImportError, OSError) as error:
+        parser.exit(-1, '{}. Exiting\n'.format(error))
 
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+'''@Author: Himaghna
+   Description: benchmarks of the thermochemistry hot paths on synthetic Gaussian log files of configurable size (number
+                of atoms, optimization steps, freq jobs and --Link1-- jobs). Times the parsing of the logs, every getter of
+                Thermochemistry, the full get_entropy_and_thermal_corrections + get_energies path and the get_thermo_gaussian
+                batch driver, and reports throughput (MB/s, logs/s) and peak memory. Results are saved as json so that runs
+                can be compared with --compare. The cold start of every module (import in a fresh interpreter) is
+                checked against COLD_START_BUDGET_SECONDS; modules of COLD_START_MODULES must not import numpy
+   Call type: python benchmark_thermo.py --atoms 50 --opt-steps 20 --logs 200 --output benchmark.json'''
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import tracemalloc
+try:
+    from . import constants as c
+except ImportError:
+    import constants as c
+
+GETTERS = ('get_amu', 'get_frequencies_inv_cm', 'get_rotational_temperatures', 'get_symmetry_number',
+           'get_vibrational_temperatures', 'get_zero_point_energy', 'get_spin_multiplicity', 'get_electronic_energy',
+           'get_vibrational_q')
+ELEMENTS = ((1, 1.00783), (6, 12.0), (7, 14.00307), (8, 15.99491))
+# modules (and command lines) that have to start fast: they import numpy, xlsxwriter, compression modules and process
+# pools only when a function needs them
+COLD_START_MODULES = ('constants', 'thermo_errors', 'Gaussian_log', 'log_cache', 'log_manifest', 'result_writers',
+                      'log_extract', 'get_search_string_from_logfiles', 'get_thermo_gaussian', 'Stat_tools',
+                      'vibrational_frequencies', 'vibrational_partition_from_log',
+                      'convert_atomic_symbols_to_atomic_numbers')
+# the numpy based modules, reported but not checked against the budget
+NUMPY_MODULES = ('Gaussian_tools', 'nasa_polynomials')
+COLD_START_BUDGET_SECONDS = 0.1
+# measured in the fresh interpreter: import time of the module and whether numpy was imported with it
+COLD_START_SCRIPT = ('import sys, time\nstart_time = time.perf_counter()\nimport {}\n'
+                     'print(time.perf_counter() - start_time, "numpy" in sys.modules)')
+
+
+def write_job_header(lines, route):
+    lines.append(' Entering Gaussian System, Link 0=g16\n')
+    lines.append(' Input=synthetic.gjf\n Output=synthetic.log\n')
+    lines.append(' ' + '-' * 70 + '\n ' + route + '\n ' + '-' * 70 + '\n')
+    lines.append(' Symbolic Z-matrix:\n Charge =  0 Multiplicity = 1\n')
+
+
+def write_orientation(lines, atoms, rng):
+    lines.append('                         Standard orientation:\n ' + '-' * 69 + '\n')
+    lines.append(' Center     Atomic      Atomic             Coordinates (Angstroms)\n')
+    lines.append(' Number     Number       Type             X           Y           Z\n ' + '-' * 69 + '\n')
+    for index, (atomic_number, mass) in enumerate(atoms):
+        lines.append(' {:6d} {:10d} {:11d} {:15.6f} {:11.6f} {:11.6f}\n'.format(
+            index + 1, atomic_number, 0, rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5)))
+    lines.append(' ' + '-' * 69 + '\n')
+
+
+def write_frequency_job(lines, atoms, rng):
+    number_of_modes = 3 * len(atoms) - 6
+    frequencies = sorted(rng.uniform(15, 3500) for mode in range(number_of_modes))
+    # one imaginary mode, as in a transition state
+    frequencies[0] = -abs(frequencies[0])
+    lines.append(' Harmonic frequencies (cm**-1), IR intensities (KM/Mole), Raman scattering\n')
+    lines.append(' activities (A**4/AMU), depolarization ratios for plane and unpolarized\n')
+    lines.append(' incident light, reduced masses (AMU), force constants (mDyne/A),\n')
+    lines.append(' and normal coordinates:\n')
+    for first_mode in range(0, number_of_modes, 3):
+        block = frequencies[first_mode:first_mode + 3]
+        lines.append(''.join('{:23d}'.format(first_mode + index + 1) for index in range(len(block))) + '\n')
+        lines.append(''.join('{:>23s}'.format('A') for mode in block) + '\n')
+        lines.append(' Frequencies --' + ''.join('{:23.4f}'.format(frequency) for frequency in block) + '\n')
+        for label in (' Red. masses --', ' Frc consts  --', ' IR Inten    --'):
+            lines.append(label + ''.join('{:23.4f}'.format(rng.uniform(0, 10)) for mode in block) + '\n')
+        lines.append('  Atom  AN' + '      X      Y      Z  ' * len(block) + '\n')
+        for index, (atomic_number, mass) in enumerate(atoms):
+            lines.append('{:6d}{:4d}'.format(index + 1, atomic_number) + ''.join(
+                '  {:7.2f}{:7.2f}{:7.2f}'.format(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1))
+                for mode in block) + '\n')
+    molecular_mass = sum(mass for atomic_number, mass in atoms)
+    zero_point_energy = 0.5 * sum(frequency for frequency in frequencies if frequency > 0) * \
+                        c.SPEED_OF_LIGHT_CENTIMETER_PER_SECOND * c.PLANK_CONSTANT_JOULE_SECOND * c.AVOGADRO_NUM
+    lines.append(' -------------------\n - Thermochemistry -\n -------------------\n')
+    lines.append(' Temperature   298.150 Kelvin.  Pressure   1.00000 Atm.\n')
+    for index, (atomic_number, mass) in enumerate(atoms):
+        lines.append(' Atom {:5d} has atomic number {:2d} and mass {:10.5f}\n'.format(index + 1, atomic_number, mass))
+    lines.append(' Molecular mass: {:12.5f} amu.\n'.format(molecular_mass))
+    lines.append(' Rotational symmetry number  1.\n')
+    lines.append(' Rotational temperatures (Kelvin) {:12.5f}{:12.5f}{:12.5f}\n'.format(
+        rng.uniform(0.01, 1), rng.uniform(0.01, 1), rng.uniform(0.01, 1)))
+    lines.append(' Zero-point vibrational energy {:14.1f} (Joules/Mol)\n'.format(zero_point_energy))
+    lines.append('                               {:14.5f} (Kcal/Mol)\n'.format(zero_point_energy * c.JOULES_TO_KCAL))
+    electronic_energy = -40.0 * len(atoms) * rng.uniform(0.9, 1.1)
+    lines.append(' Zero-point correction=                           {:.6f} (Hartree/Particle)\n'.format(
+        zero_point_energy / c.HARTREES_TO_JOULES_PER_MOLE))
+    lines.append(' Sum of electronic and zero-point Energies=        {:.6f}\n'.format(
+        electronic_energy + zero_point_energy / c.HARTREES_TO_JOULES_PER_MOLE))
+
+
+# write a synthetic Gaussian log. The first job is an optimization with opt_steps steps, followed by freq_jobs frequency
+# jobs. link1_jobs further single point --Link1-- jobs are appended at the end
+def write_synthetic_log(log_file, atoms = 20, opt_steps = 10, freq_jobs = 1, link1_jobs = 0, seed = 0):
+    rng = random.Random(seed)
+    atom_list = [ELEMENTS[rng.randrange(len(ELEMENTS))] for atom in range(max(atoms, 3))]
+    lines = []
+    write_job_header(lines, '#p opt b3lyp/6-31g(d)')
+    for step in range(opt_steps):
+        write_orientation(lines, atom_list, rng)
+        lines.append(' SCF Done:  E(RB3LYP) =  {:.9f}     A.U. after   10 cycles\n'.format(-40.0 * len(atom_list)))
+        lines.append(' Step number {:3d} out of a maximum of  100\n'.format(step + 1))
+    lines.append(' Normal termination of Gaussian 16 at Mon Mar 19 12:00:00 2018.\n')
+    for job in range(freq_jobs):
+        write_job_header(lines, '#p freq b3lyp/6-31g(d) geom=allcheck guess=read')
+        write_orientation(lines, atom_list, rng)
+        write_frequency_job(lines, atom_list, rng)
+        lines.append(' Normal termination of Gaussian 16 at Mon Mar 19 12:00:00 2018.\n')
+    for job in range(link1_jobs):
+        write_job_header(lines, '#p sp ccsd(t)/cc-pvtz geom=allcheck')
+        write_orientation(lines, atom_list, rng)
+        lines.append(' Normal termination of Gaussian 16 at Mon Mar 19 12:00:00 2018.\n')
+    with open(log_file, 'w') as fp:
+        fp.writelines(lines)
+
+
+# run function repeat times and return the best wall time (s) and the peak of python memory allocations (bytes)
+def time_call(function, repeat = 3):
+    best_time = float('inf')
+    for run in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_time, peak_memory
+
+
+def get_record(name, elapsed_time, peak_memory, number_of_logs = 1, number_of_bytes = 0):
+    record = {'name': name, 'seconds': elapsed_time, 'peak_memory_bytes': peak_memory,
+              'logs_per_second': number_of_logs / elapsed_time if elapsed_time and number_of_logs else None}
+    if number_of_bytes:
+        record['MB_per_second'] = number_of_bytes / 1e6 / elapsed_time if elapsed_time else None
+    return record
+
+
+def run_benchmarks(folder, number_of_logs, repeat, workers):
+    try:
+        from .Gaussian_log import GaussianLog, SCAN_MODES
+        from .Gaussian_tools import Thermochemistry
+        from . import get_thermo_gaussian
+    except ImportError:
+        from Gaussian_log import GaussianLog, SCAN_MODES
+        from Gaussian_tools import Thermochemistry
+        import get_thermo_gaussian
+    log_files = sorted(os.path.join(folder, file) for file in os.listdir(folder) if file.endswith('.log'))
+    log_file = log_files[0]
+    log_size = os.path.getsize(log_file)
+    total_size = sum(os.path.getsize(file) for file in log_files)
+    temperature = 393.15
+    argument = {'apply_qrrho': True, 'rotation': True, 'translation': 3, 'translation_parameter': c.ATM_TO_PASCAL}
+    records = []
+
+    for scan_mode in SCAN_MODES:
+        elapsed_time, peak_memory = time_call(lambda: GaussianLog(log_file, scan_mode=scan_mode), repeat)
+        records.append(get_record('parse:' + scan_mode, elapsed_time, peak_memory, number_of_bytes=log_size))
+
+    elapsed_time, peak_memory = time_call(lambda: Thermochemistry(log_file, temperature, 'get'), repeat)
+    records.append(get_record('Thermochemistry.__init__', elapsed_time, peak_memory, number_of_bytes=log_size))
+    thermo_object = Thermochemistry(log_file, temperature, 'get')
+
+    # setting the temperature clears the quantities cached by thermo_object, so that every repeat times their computation
+    # and not a cache hit
+    def uncached(function):
+        def call():
+            thermo_object.temperature = temperature
+            return function()
+        return call
+    for getter in GETTERS:
+        elapsed_time, peak_memory = time_call(uncached(getattr(thermo_object, getter)), repeat)
+        records.append(get_record('getter:' + getter, elapsed_time, peak_memory, number_of_logs=0))
+    elapsed_time, peak_memory = time_call(uncached(lambda: thermo_object.get_entropy_and_thermal_corrections(**argument)),
+                                          repeat)
+    records.append(get_record('get_entropy_and_thermal_corrections', elapsed_time, peak_memory, number_of_logs=0))
+
+    def full_path():
+        full_thermo_object = Thermochemistry(log_file, temperature, 'get')
+        entropy, energy_thermal_corrections = full_thermo_object.get_entropy_and_thermal_corrections(**argument)
+        full_thermo_object.get_energies(entropy, energy_thermal_corrections)
+    elapsed_time, peak_memory = time_call(full_path, repeat)
+    records.append(get_record('get_energies:full_path', elapsed_time, peak_memory, number_of_bytes=log_size))
+
+    for vectorized in [False, True]:
+        name = 'get_thermo_gaussian:{}workers{}'.format(workers, ':vectorized' if vectorized else '')
+        batch = lambda: get_thermo_gaussian.__main__(folder, temperature, c.ATM_TO_PASCAL, workers=workers,
+                                                     output_format='csv', vectorized=vectorized)
+        # the batch driver prints one line per log
+        with open(os.devnull, 'w') as devnull:
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                elapsed_time, peak_memory = time_call(batch, 1)
+            finally:
+                sys.stdout = stdout
+        records.append(get_record(name, elapsed_time, peak_memory, number_of_logs=number_of_logs,
+                                  number_of_bytes=total_size))
+    return records
+
+
+# best time (s) of importing module in repeat fresh interpreters started in the folder of this file, and whether numpy
+# was imported with it
+def time_cold_start(module, repeat = 3):
+    folder = os.path.dirname(os.path.abspath(__file__))
+    best_time = float('inf')
+    for run in range(repeat):
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT.format(module)], cwd=folder, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+        best_time = min(best_time, float(output[0]))
+    return best_time, output[1] == 'True'
+
+
+def run_cold_start_benchmarks(repeat):
+    records = []
+    for module in COLD_START_MODULES + NUMPY_MODULES:
+        elapsed_time, imports_numpy = time_cold_start(module, repeat)
+        record = get_record('cold_start:' + module, elapsed_time, 0, number_of_logs=0)
+        record['imports_numpy'] = imports_numpy
+        if module in COLD_START_MODULES:
+            record['within_budget'] = elapsed_time <= COLD_START_BUDGET_SECONDS and not imports_numpy
+        records.append(record)
+    return records
+
+
+# print the ratio of the time of every benchmark to the time of the same benchmark in a previous result file
+def compare_results(results, previous_results_file):
+    with open(previous_results_file) as fp:
+        previous_records = dict((record['name'], record) for record in json.load(fp)['records'])
+    print('\n{:50s} {:>12s} {:>12s} {:>8s}'.format('benchmark', 'previous (s)', 'current (s)', 'ratio'))
+    for record in results['records']:
+        if record['name'] in previous_records:
+            previous_time = previous_records[record['name']]['seconds']
+            print('{:50s} {:12.6f} {:12.6f} {:8.2f}'.format(record['name'], previous_time, record['seconds'],
+                                                           record['seconds'] / previous_time if previous_time else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark thermochemistry parsing and evaluation on synthetic logs')
+    parser.add_argument('--atoms', type=int, default=30, help='Number of atoms of every synthetic species')
+    parser.add_argument('--opt-steps', type=int, default=20, help='Number of optimization steps before the freq jobs')
+    parser.add_argument('--freq-jobs', type=int, default=1, help='Number of freq jobs in every log')
+    parser.add_argument('--link1-jobs', type=int, default=0, help='Number of extra --Link1-- jobs in every log')
+    parser.add_argument('--logs', type=int, default=50, help='Number of logs for the batch driver benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions of every timing (best is kept)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Workers of the batch driver')
+    parser.add_argument('--output', default='benchmark_thermo.json', help='json file the results are written to')
+    parser.add_argument('--compare', default=None, help='json file of a previous run to compare the results with')
+    parser.add_argument('--cold-start-only', action='store_true',
+                        help='Only check the import time of the modules against the cold start budget')
+    command_args = parser.parse_args()
+
+    records = run_cold_start_benchmarks(command_args.repeat)
+    if not command_args.cold_start_only:
+        folder = tempfile.mkdtemp(prefix='benchmark_thermo_')
+        try:
+            for index in range(command_args.logs):
+                write_synthetic_log(os.path.join(folder, 'species_{:05d}.log'.format(index)), atoms=command_args.atoms,
+                                    opt_steps=command_args.opt_steps, freq_jobs=command_args.freq_jobs,
+                                    link1_jobs=command_args.link1_jobs, seed=index)
+            records += run_benchmarks(folder, command_args.logs, command_args.repeat, command_args.workers)
+        finally:
+            shutil.rmtree(folder)
+
+    results = {'date': datetime.datetime.now().isoformat(), 'python': platform.python_version(),
+               'platform': platform.platform(), 'parameters': vars(command_args), 'records': records}
+    with open(command_args.output, 'w') as fp:
+        json.dump(results, fp, indent=2)
+    for record in records:
+        print('{:50s} {:12.6f} s {:>12s} {:>10s} peak {:8.1f} kB'.format(
+            record['name'], record['seconds'],
+            '{:.1f} MB/s'.format(record['MB_per_second']) if record.get('MB_per_second') else '',
+            '{:.1f} logs/s'.format(record['logs_per_second']) if record['logs_per_second'] else '',
+            record['peak_memory_bytes'] / 1e3))
+    over_budget = [record['name'] for record in records if record.get('within_budget') is False]
+    if over_budget:
+        print('\nOver the cold start budget of {} s (or importing numpy): {}'.format(COLD_START_BUDGET_SECONDS,
+                                                                                 ', '.join(over_budget)))
+    if command_args.compare:
+        compare_results(results, command_args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,55 +1,90 @@
 '''Author" Himaghna Bh. 2/15/2018'''
-'''This file is used to convert a column of a file ('filename') containing atomic symbols to corresponding atomic numbers'''
-
-#input filename
-filename = input('enter filename with complete path and extension: \n')
-column = input('enter column you want processed. default is 1st column: \n') or 1
-delem = input('enter delimiter in file. Default is space: \n') or ' '
-column =- 1                       #converting column number to index
-
-#generate a dictionary with key ==> atomic number and value ==> atomic number
-atomic_dictionary = dict()
-
-
-try:
-    with open('/Users/Ne0/Documents/Prof/Research/Files/periodic_table.txt', 'r') as ptable:
-        for line in ptable:
-            key = (line.strip()).split(',')[1]
-            value = line.strip().split(',')[0]
-            atomic_dictionary[key] = value
-except:
-    print("File doesn't exist")
-
-
-#load source file
-try:
-    source = open(filename,'r')
-
-except:
-    print("No such file")
-
-#output file
-try:
-    outfile = open(filename.split('.')[0]+'_out.'+filename.split('.')[1], 'w')
-except:
-    print('ERROR: Could not create output file')
-
-
-
-
-for line in source:
-    for word in line.split():
-        try:
-            outfile.write(atomic_dictionary[word])     #If it is a symbol of an element
-        except:
-            #if not an atomic symbol
-            outfile.write(word)
-        outfile.write(delem)
-    outfile.write('\n')
-
-
-source.close()
-outfile.close()
-
-
-
+'''This file is used to convert a column of a file ('filename') containing atomic symbols to corresponding atomic numbers.
+   Files are streamed in blocks of whole lines and only the selected column is rewritten (everything else, including the
+   spacing, is copied as is), so multi-GB XYZ or trajectory dumps convert at close to disk speed. Many files are
+   converted in parallel
+   Call type: convert_atomic_symbols_to_atomic_numbers.py file1.xyz file2.xyz -c 1 -w 4'''
+import os
+import re
+import argparse
+import functools
+
+ELEMENT_SYMBOLS = ('H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar', 'K',
+                   'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr',
+                   'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I',
+                   'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb',
+                   'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr',
+                   'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf',
+                   'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og')
+# atomic symbol -> atomic number, as bytes so that files are converted without decoding them
+ATOMIC_NUMBERS = dict((symbol.encode(), str(index + 1).encode()) for index, symbol in enumerate(ELEMENT_SYMBOLS))
+# lines are read in blocks of about this many bytes
+BLOCK_SIZE = 1 << 22
+
+
+# expression matching the start of every line up to (group 1) and including (group 2) the field of column (1 is the first
+# column). delimiter: None for any run of whitespace (leading whitespace ignored) or a single character
+@functools.lru_cache(maxsize=None)
+def get_column_pattern(column, delimiter = None):
+    if column < 1:
+        raise ValueError('column should be 1 or more')
+    if delimiter is None:
+        pattern = r'^([ \t]*(?:[^\s]+[ \t]+){%d})([^\s]+)' % (column - 1)
+    else:
+        separator = re.escape(delimiter)
+        # the field stops at a carriage return too, so that the last column of CRLF files is converted
+        pattern = r'^((?:[^%s\n]*%s){%d})([^%s\r\n]*)' % (separator, separator, column - 1, separator)
+    return re.compile(pattern.encode(), re.MULTILINE)
+
+
+def replace_symbol(match):
+    return match.group(1) + ATOMIC_NUMBERS.get(match.group(2), match.group(2))
+
+
+# write the text of input_filename with the atomic symbols of column replaced by atomic numbers to output_filename
+# (default: <input name>_out<extension>). Fields that are not atomic symbols (e.g. the atom count and comment lines of
+# an xyz file) are kept. Returns the name of the output file
+def convert_file(input_filename, output_filename = None, column = 1, delimiter = None):
+    if output_filename is None:
+        root, extension = os.path.splitext(input_filename)
+        output_filename = root + '_out' + extension
+    column_pattern = get_column_pattern(column, delimiter)
+    with open(input_filename, 'rb') as source, open(output_filename, 'wb') as outfile:
+        while True:
+            lines = source.readlines(BLOCK_SIZE)
+            if not lines:
+                break
+            outfile.write(column_pattern.sub(replace_symbol, b''.join(lines)))
+    return output_filename
+
+
+# convert every file (output files named as by convert_file), in parallel over a process pool if workers > 1. Returns
+# the names of the output files in the order of input_filenames
+def convert_files(input_filenames, column = 1, delimiter = None, workers = 1):
+    convert = functools.partial(convert_file, column=column, delimiter=delimiter)
+    if workers > 1 and len(input_filenames) > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(input_filenames))) as executor:
+            return list(executor.map(convert, input_filenames))
+    return [convert(input_filename) for input_filename in input_filenames]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the atomic symbols of a column of text files to atomic numbers')
+    parser.add_argument('filenames', nargs='+', help='Files to convert. Each is written to <name>_out<extension>')
+    parser.add_argument('-c', '--column', type=int, default=1, help='Column holding the atomic symbols (1 is the first)')
+    parser.add_argument('-d', '--delimiter', default=None,
+                        help='Single character separating the columns. Default is any run of whitespace')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of files converted in parallel')
+    command_args = parser.parse_args()
+    if command_args.column < 1:
+        parser.error('column should be 1 or more')
+    if command_args.delimiter is not None and len(command_args.delimiter) != 1:
+        parser.error('delimiter should be a single character')
+    for output_filename in convert_files(command_args.filenames, command_args.column, command_args.delimiter,
+                                         command_args.workers):
+        print(output_filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,59 @@ date: 18th April 2018
 description: run with a foldername to get thermochemistry of all log files in the folder
 '''
 
-from py_box.thermo.nasa import Nasa
 import os
-import numpy as np
-import glob
-from Gaussian_tools import Thermochemistry
-import constants as c
+try:
+    from . import constants as c
+    from . import instrumentation
+    from .Gaussian_log import GaussianLog, SCAN_MODES, get_log_files, get_log_name
+    from .log_cache import LogCache, CACHE_FILE_NAME
+    from .result_writers import open_row_writer, write_rows, WRITER_FORMATS
+    from .log_manifest import LogManifest, MANIFEST_FILE_NAME, is_log_finished
+    from .log_prefetch import LogPrefetcher, PREFETCH_DEPTH, READ_SIZE
+    from .results_store import ResultsStore, RESULTS_FILE_NAME, RESULT_VALUES
+    from .thermo_errors import ThermochemistryError, InvalidOptionError
+    from .log_shards import (WorkQueue, SHARD_FOLDER_NAME, CHUNK_SIZE, STALE_CLAIM_SECONDS, parse_shard,
+                             get_shard_log_files, write_part, read_parts)
+except ImportError:
+    import constants as c
+    import instrumentation
+    from Gaussian_log import GaussianLog, SCAN_MODES, get_log_files, get_log_name
+    from log_cache import LogCache, CACHE_FILE_NAME
+    from result_writers import open_row_writer, write_rows, WRITER_FORMATS
+    from log_manifest import LogManifest, MANIFEST_FILE_NAME, is_log_finished
+    from log_prefetch import LogPrefetcher, PREFETCH_DEPTH, READ_SIZE
+    from results_store import ResultsStore, RESULTS_FILE_NAME, RESULT_VALUES
+    from thermo_errors import ThermochemistryError, InvalidOptionError
+    from log_shards import (WorkQueue, SHARD_FOLDER_NAME, CHUNK_SIZE, STALE_CLAIM_SECONDS, parse_shard,
+                            get_shard_log_files, write_part, read_parts)
 import datetime
 import argparse
-import xlsxwriter
+import importlib
+import collections
+import functools
+import time
 
+HEADER_SI = ['Species', 'Gibbs (J/mol)', 'Enthalpy(J/mol)', 'Entropy(J/mol/K)', 'Electronic(J/mol)', 'ZPE(J/mol)', 'Error']
+HEADER_KCAL = ['Species', 'Gibbs (kcal/mol)', 'Enthalpy(kcal/mol)', 'Entropy(kcal/mol/K)', 'Electronic(kcal/mol)',
+               'ZPE(kcal/mol)', 'Error']
+# keys of the values of a SpeciesResult, in the order of results_store.RESULT_VALUES
+RESULT_KEYS = ('G_SI', 'H_SI', 'S_SI', 'Electronic_SI', 'ZPE_SI')
+
+
+# module of this package (or of the folder when run as a script). The numpy based modules (Gaussian_tools,
+# nasa_polynomials) are imported with this on first use so that the command line starts and answers --help without numpy
+def import_module(name):
+    if __package__:
+        return importlib.import_module('.' + name, __package__)
+    return importlib.import_module(name)
+
+
+# arguments of Thermochemistry.get_entropy_and_thermal_corrections and masses of the mobile species of a gas (at pressure,
+# in Pa) or an adsorbed species. Raises InvalidOptionError for a gas without pressure
 def build_argument(is_gas, pressure = None):
     if is_gas:
         if not pressure:
-            # no pressure defined for gas
-            print('Enter pressure')
-            return 'NaN'
+            raise InvalidOptionError('a pressure is needed for the translation of gases')
         argument = {
             'apply_qrrho': True,
             'rotation': True,
@@ -41,92 +78,719 @@ def build_argument(is_gas, pressure = None):
 
 
 def write_to_excel(out_file  = '', data = ()):
-    workbook = xlsxwriter.Workbook(filename=out_file)
-    worksheet = workbook.add_worksheet()
-    for index,row in enumerate(data):
-        worksheet.write_row(index, 0, tuple(row))
-
-def __main__(path, temperature, pressure = 101325):
-
-    if os.path.isdir(path):
-        #folder supplied as argument
-        time_stamp = datetime.datetime.now()
-        out_file_SI = path + '/thermochemistry_all_species_SI-units_' + str(time_stamp.date()) + '.xlsx'
-        out_file_kcal = path + '/thermochemistry_all_species_KCAL_' + str(time_stamp.date()) + '.xlsx'
-        out_list_SI =[['Species', 'Gibbs (J/mol)', 'Enthalpy(J/mol)', 'Entropy(J/mol/K)', 'Electronic(J/mol)', 'ZPE(J/mol)']]
-        out_list_kcal = [['Species', 'Gibbs (kcal/mol)', 'Enthalpy(kcal/mol)', 'Entropy(kcal/mol/K)', 'Electronic(kcal/mol)', 'ZPE(kcal/mol)']]
-        for file in glob.glob(os.path.join(path, '*.log')):
-            print(file)
-            #check if logfile represents a species adsorbed on Q1 site
-            if file.split('/')[-1].split('-')[0] == 'Q1':
-                is_gas = False
-                print('Treating species as adsorbed with only vibrational degrees of freedom...')
-            else:
-                is_gas = True
-                print('Treating species as ideal gas...')
-
-            #build argument for calling get_entropy_and_thermal_corrections method and also define mass_mobile_species
-            argument, mass_mobile_species= build_argument(is_gas = is_gas, pressure= pressure)
-
-            #instantiate Thermochemistry class
-            thermo_object = Thermochemistry(log_file=file, temperature=temperature, mass_mobile_species=mass_mobile_species)
-            entropy, energy_corrections = thermo_object.get_entropy_and_thermal_corrections(**argument)
-            energies = thermo_object.get_energies(entropy, energy_corrections)
+    write_rows(out_file, data)
 
-            #tabulate outputs
-            G_SI = energies['gibbs_free_energy']
-            G_kcal = G_SI * c.JOULES_TO_KCAL
 
-            H_SI = energies['enthalpy']
-            H_kcal = H_SI * c.JOULES_TO_KCAL
+# a species is treated as adsorbed on the Q1 site (only vibrational degrees of freedom) if its log file name starts with Q1-
+def is_gas_species(file):
+    return not os.path.basename(file).split('-')[0] == 'Q1'
 
-            S_SI = sum([entropy[key] for key in entropy])
-            S_kcal = S_SI * c.JOULES_TO_KCAL
 
-            Electronic_SI = energies['electronic_energy']
-            Electronic_kcal = Electronic_SI * c.JOULES_TO_KCAL
+# one LogCache per cache file and process (worker processes cannot share sqlite connections)
+log_caches = dict()
 
-            ZPE_SI = thermo_object.get_zero_point_energy()
-            ZPE_kcal = ZPE_SI * c.JOULES_TO_KCAL
 
-            out_list_SI.append([file.split('.')[0].split('/')[-1], G_SI, H_SI, S_SI, Electronic_SI, ZPE_SI])
-            out_list_kcal.append([file.split('.')[0].split('/')[-1], G_kcal, H_kcal, S_kcal, Electronic_kcal, ZPE_kcal])
-        out_list_SI.append(['Temperature:', temperature])
-        out_list_SI.append(['Pressure:', pressure])
-        out_list_kcal.append(['Temperature:', temperature])
-        out_list_kcal.append(['Pressure:', pressure])
+def get_log_cache(cache_file, use_hash = False):
+    if not cache_file in log_caches:
+        log_caches[cache_file] = LogCache(cache_file, use_hash=use_hash)
+    return log_caches[cache_file]
 
 
-        write_to_excel(out_file=out_file_SI, data=out_list_SI)
-        write_to_excel(out_file=out_file_kcal, data=out_list_kcal)
+# GaussianLog of a log file. cache_file: optional LogCache file so that unchanged logs are not parsed again (with use_hash
+# the cached entries are also validated against the contents of the logs). scan_mode, job and log_data: see GaussianLog
+def parse_log(file, cache_file = None, use_hash = False, scan_mode = 'stream', job = 'last_freq', log_data = None):
+    if cache_file:
+        return get_log_cache(cache_file, use_hash).get_parsed_log(file, scan_mode=scan_mode, job=job, log_data=log_data)
+    return GaussianLog(file, scan_mode=scan_mode, job=job, log_data=log_data)
 
 
+def get_species_name(file):
+    return get_log_name(file)
 
-parser = argparse.ArgumentParser(description = 'Enter')
 
-parser.add_argument('path', type=str, default=None,
-                    help='Name of folder with log files from Gaussian')
-parser.add_argument('-t', '--temperature', type =float, default = 120.0,
-                    help = 'Temperature is degree Celsius for applying thermal corrections')
-parser.add_argument('-p', '--pressure',type = float, default = 1.0,
-                    help = 'Pressure in atmospheres')
-command_args =  parser.parse_args()
-path = command_args.path
-temperature = command_args.temperature + 273.15 #convert to Kelvin
-pressure = command_args.pressure *c.ATM_TO_PASCAL #convert to Pascal
-__main__(path = path, temperature= temperature, pressure=pressure)
+def get_error_message(error):
+    return '{}: {}'.format(type(error).__name__, str(error) or 'no message')
 
 
+# result of the evaluation of one log file. values: dictionary of the keyword arguments of get_rows (SI units) or None if
+# the evaluation failed with an error (message) of type error_type (name of the exception class)
+SpeciesResult = collections.namedtuple('SpeciesResult', ['species', 'log_file', 'values', 'error', 'error_type'])
 
 
+def get_error_result(file, error):
+    return SpeciesResult(get_species_name(file), file, None, get_error_message(error), type(error).__name__)
 
 
+# rows for the SI and kcal tables of a SpeciesResult
+def get_result_rows(result):
+    if result.error is not None:
+        return get_rows(result.species, error=result.error)
+    return get_rows(result.species, **result.values)
 
 
+# rows of every result. error_counts (a collections.Counter) counts the errors by type
+def get_rows_from_results(results, error_counts):
+    for result in results:
+        if result.error is not None:
+            error_counts[result.error_type] += 1
+        yield get_result_rows(result)
 
 
+# rows for the SI and kcal tables from the values in SI units, or from an error message
+def get_rows(species, G_SI = '', H_SI = '', S_SI = '', Electronic_SI = '', ZPE_SI = '', error = None):
+    if error is not None:
+        return [species, '', '', '', '', '', error], [species, '', '', '', '', '', error]
+    row_SI = [species, G_SI, H_SI, S_SI, Electronic_SI, ZPE_SI]
+    row_kcal = [species] + [value * c.JOULES_TO_KCAL for value in row_SI[1:]]
+    return row_SI, row_kcal
 
 
+# evaluate a single log file and return its SpeciesResult. Errors are returned in the result instead of raised so that
+# one bad log does not stop the batch (or a worker of the process pool). Besides the ThermochemistryError of bad logs any
+# unexpected exception is caught too, but not KeyboardInterrupt.
+# options: keyword arguments of parse_log
+@instrumentation.timed('evaluate_species')
+def evaluate_species(file, temperature, pressure, **options):
+    with instrumentation.profile(get_species_name(file)):
+        try:
+            parsed_log = parse_log(file, **options)
+            #build argument for calling get_entropy_and_thermal_corrections method and also define mass_mobile_species
+            argument, mass_mobile_species = build_argument(is_gas=is_gas_species(file), pressure=pressure)
 
+            #instantiate Thermochemistry class
+            Thermochemistry = import_module('Gaussian_tools').Thermochemistry
+            thermo_object = Thermochemistry(log_file=file, temperature=temperature,
+                                            mass_mobile_species=mass_mobile_species, parsed_log=parsed_log)
+            entropy, energy_corrections = thermo_object.get_entropy_and_thermal_corrections(**argument)
+            energies = thermo_object.get_energies(entropy, energy_corrections)
 
+            #tabulate outputs
+            values = {'G_SI': energies['gibbs_free_energy'], 'H_SI': energies['enthalpy'],
+                      'S_SI': sum([entropy[key] for key in entropy]), 'Electronic_SI': energies['electronic_energy'],
+                      'ZPE_SI': thermo_object.get_zero_point_energy()}
+            return SpeciesResult(get_species_name(file), file, values, None, None)
+        except Exception as error:
+            return get_error_result(file, error)
+
+
+# GaussianLog of a log file and None, or None and the SpeciesResult of the error if it cannot be parsed
+def try_parse_log(file, **options):
+    try:
+        with instrumentation.profile(get_species_name(file) + '.parse'):
+            return parse_log(file, **options), None
+    except Exception as error:
+        return None, get_error_result(file, error)
+
+
+# apply function to every log file, in parallel over a process pool if workers > 1. Results are yielded in the order of
+# log_files. With instrumentation enabled the workers send their records back with the results.
+# prefetcher: optional LogPrefetcher of log_files, used if workers is 1. function is then called with the bytes of
+# every log as keyword argument log_data
+def map_log_files(function, log_files, workers = 1, prefetcher = None):
+    if workers <= 1 and prefetcher is not None:
+        for file, log_data in prefetcher:
+            yield function(file, log_data=log_data)
+    elif workers > 1:
+        import concurrent.futures
+        instrumented = instrumentation.is_enabled()
+        if instrumented:
+            function = functools.partial(instrumentation.call_instrumented, function,
+                                         instrumentation.recorder.profile_folder)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            #map keeps the order of its input; chunks amortize the cost of sending work to the pool
+            chunk_size = max(1, len(log_files) // (workers * 4))
+            for result in executor.map(function, log_files, chunksize=chunk_size):
+                yield instrumentation.merge_result(result) if instrumented else result
+    else:
+        for file in log_files:
+            yield function(file)
+
+
+# evaluate all log files one by one with Thermochemistry. SpeciesResults are yielded in the order of log_files
+# options: keyword arguments of parse_log (cache_file, use_hash, scan_mode, job). prefetcher: see map_log_files
+def evaluate_all_species(log_files, temperature, pressure, workers = 1, prefetcher = None, **options):
+    evaluate = functools.partial(evaluate_species, temperature=temperature, pressure=pressure, **options)
+    return map_log_files(evaluate, log_files, workers, prefetcher)
+
+
+# evaluate all log files at once with ThermochemistryBatch once they are all parsed (in parallel if workers > 1).
+# SpeciesResults are yielded in the order of log_files. on_parsed: optional function called with every log file once it
+# is parsed, e.g. to show that a long batch is alive
+def evaluate_all_species_vectorized(log_files, temperature, pressure, workers = 1, prefetcher = None, on_parsed = None,
+                                    **options):
+    parsed = []
+    for file, parse_result in zip(log_files, map_log_files(functools.partial(try_parse_log, **options), log_files,
+                                                           workers, prefetcher)):
+        parsed.append(parse_result)
+        if on_parsed is not None:
+            on_parsed(file)
+    parsed_indices = []
+    arguments = []
+    masses_mobile_species = []
+    for index, (parsed_log, error_result) in enumerate(parsed):
+        if parsed_log is None:
+            continue
+        # a species without valid arguments gets an error result, as in evaluate_species
+        try:
+            argument, mass_mobile_species = build_argument(is_gas=is_gas_species(log_files[index]), pressure=pressure)
+        except ThermochemistryError as error:
+            parsed[index] = (None, get_error_result(log_files[index], error))
+            continue
+        parsed_indices.append(index)
+        arguments.append(argument)
+        masses_mobile_species.append(mass_mobile_species)
+    ThermochemistryBatch = import_module('Gaussian_tools').ThermochemistryBatch
+    batch = ThermochemistryBatch([parsed[index][0] for index in parsed_indices], temperature, masses_mobile_species,
+                                 arguments)
+    entropy, energy_corrections = batch.get_entropy_and_thermal_corrections()
+    energies = batch.get_energies(entropy, energy_corrections)
+    total_entropy = sum(entropy.values())
+    position = dict((index, position) for position, index in enumerate(parsed_indices))
+    for index, file in enumerate(log_files):
+        if not index in position:
+            yield parsed[index][1]
+            continue
+        i = position[index]
+        if batch.errors[i] is not None:
+            yield get_error_result(file, batch.errors[i])
+            continue
+        values = {'G_SI': float(energies['gibbs_free_energy'][i]), 'H_SI': float(energies['enthalpy'][i]),
+                  'S_SI': float(total_entropy[i]), 'Electronic_SI': float(energies['electronic_energy'][i]),
+                  'ZPE_SI': float(batch.zero_point_energies[i])}
+        yield SpeciesResult(get_species_name(file), file, values, None, None)
+
+
+# fit NASA polynomials to all log files of path and write them to a Chemkin thermo file in path. The entropy of gases is
+# at pressure. nasa_temperatures: low, middle and high temperature (K) of the two ranges (default: those of
+# nasa_polynomials). options: keyword arguments of parse_log. Returns the name of the thermo file
+def write_nasa_polynomials(path, pressure, workers = 1, nasa_temperatures = None, **options):
+    import numpy as np
+    nasa = import_module('nasa_polynomials')
+    if nasa_temperatures is None:
+        nasa_temperatures = (nasa.NASA_TEMPERATURE_LOW, nasa.NASA_TEMPERATURE_MID, nasa.NASA_TEMPERATURE_HIGH)
+    log_files = get_log_files(path)
+    parsed = list(map_log_files(functools.partial(try_parse_log, **options), log_files, workers))
+    parsed_logs, masses_mobile_species, arguments, species_names, phases = [], [], [], [], []
+    for file, (parsed_log, error_result) in zip(log_files, parsed):
+        if parsed_log is None:
+            print('{} skipped: {}'.format(file, error_result.error))
+            continue
+        argument, mass_mobile_species = build_argument(is_gas=is_gas_species(file), pressure=pressure)
+        parsed_logs.append(parsed_log)
+        masses_mobile_species.append(mass_mobile_species)
+        arguments.append(argument)
+        species_names.append(get_species_name(file))
+        phases.append('G' if is_gas_species(file) else 'S')
+    coefficients = nasa.fit_nasa_polynomials(parsed_logs, masses_mobile_species, arguments, *nasa_temperatures, workers=workers)
+    fitted = [index for index in range(len(parsed_logs)) if np.all(np.isfinite(coefficients[index]))]
+    # the checks of ThermochemistryBatch only, without evaluating the species again, to report why a fit failed
+    get_error = import_module('Gaussian_tools').ThermochemistryBatch.get_error
+    for index in sorted(set(range(len(parsed_logs))) - set(fitted)):
+        error = get_error(parsed_logs[index], masses_mobile_species[index], arguments[index])
+        print('{} skipped: {}'.format(species_names[index], get_error_message(error) if error else
+                                      'incomplete thermochemistry data in log file'))
+    out_file = path + '/thermo_nasa_' + str(datetime.datetime.now().date()) + '.dat'
+    nasa.write_chemkin_thermo(out_file, [species_names[index] for index in fitted], coefficients[fitted],
+                         [phases[index] for index in fitted], *nasa_temperatures)
+    print('NASA polynomials of {} species written to {}'.format(len(fitted), out_file))
+    return out_file
+
+
+# Gibbs free energy, enthalpy (J/mol) and entropy (J/mol/K) of every log file of path (columns) at temperatures (rows)
+# from one evaluation of ThermochemistryBatch, and the species names of the columns. The entropy of gases is at pressure.
+# Species that cannot be parsed or evaluated are reported and get nan columns. options: keyword arguments of parse_log
+def get_species_thermo_grid(path, temperatures, pressure, workers = 1, **options):
+    import numpy as np
+    log_files = get_log_files(path)
+    parsed = list(map_log_files(functools.partial(try_parse_log, **options), log_files, workers))
+    species_names = [get_species_name(file) for file in log_files]
+    parsed_indices = [index for index, (parsed_log, error) in enumerate(parsed) if parsed_log is not None]
+    for file, (parsed_log, error_result) in zip(log_files, parsed):
+        if parsed_log is None:
+            print('{} skipped: {}'.format(file, error_result.error))
+    arguments = []
+    masses_mobile_species = []
+    for index in parsed_indices:
+        argument, mass_mobile_species = build_argument(is_gas=is_gas_species(log_files[index]), pressure=pressure)
+        arguments.append(argument)
+        masses_mobile_species.append(mass_mobile_species)
+    temperatures = np.asarray(temperatures, dtype=float).ravel()
+    shape = (temperatures.size, len(log_files))
+    gibbs_free_energy, enthalpy, entropy = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+    if parsed_indices:
+        ThermochemistryBatch = import_module('Gaussian_tools').ThermochemistryBatch
+        batch = ThermochemistryBatch([parsed[index][0] for index in parsed_indices], temperatures, masses_mobile_species,
+                                     arguments)
+        batch_entropy, energy_corrections = batch.get_entropy_and_thermal_corrections()
+        energies = batch.get_energies(batch_entropy, energy_corrections)
+        gibbs_free_energy[:, parsed_indices] = energies['gibbs_free_energy']
+        enthalpy[:, parsed_indices] = energies['enthalpy']
+        entropy[:, parsed_indices] = sum(batch_entropy.values())
+        for index, error in zip(parsed_indices, batch.errors):
+            if error is not None:
+                print('{} skipped: {}'.format(log_files[index], get_error_message(error)))
+    return gibbs_free_energy, enthalpy, entropy, species_names
+
+
+# evaluate the reactions of reaction_file (see reactions) over the species of path at every temperature and write one
+# row per reaction and temperature (reaction and activation properties, forward and reverse transition state theory rate
+# constants and equilibrium constant) to a table in path. Values that cannot be computed (no transition state, species
+# without data) are left empty. Raises InvalidOptionError if a reaction names species that have no log in path. Returns
+# the name of the table
+def write_reactions(path, reaction_file, temperatures, pressure, workers = 1, output_format = 'xlsx', **options):
+    import numpy as np
+    reactions = import_module('reactions')
+    # the reaction file is checked against the species of path before any log is parsed
+    network = reactions.ReactionNetwork(reactions.read_reactions(reaction_file),
+                                        [get_species_name(file) for file in get_log_files(path)])
+    gibbs_free_energy, enthalpy, entropy, species_names = get_species_thermo_grid(path, temperatures, pressure, workers,
+                                                                                  **options)
+    species_without_data = set(name for name, values in zip(species_names, gibbs_free_energy.T)
+                               if not np.any(np.isfinite(values)))
+    for label, names in network.get_reaction_species(lambda name: name in species_without_data):
+        print('Reaction {} left empty: no data for {}'.format(label, ', '.join(names)))
+    temperatures = np.asarray(temperatures, dtype=float).ravel()
+    results = reactions.evaluate_network(network, temperatures, gibbs_free_energy, enthalpy, entropy)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        results['reverse_rate_constant'] = results['forward_rate_constant'] / results['equilibrium_constant']
+    columns = ['gibbs_free_energy', 'enthalpy', 'entropy', 'activation_gibbs_free_energy', 'activation_enthalpy',
+               'activation_entropy', 'forward_rate_constant', 'reverse_rate_constant', 'equilibrium_constant']
+    header = ['Reaction', 'Equation', 'Temperature (K)', 'Reaction Gibbs (J/mol)', 'Reaction enthalpy (J/mol)',
+              'Reaction entropy (J/mol/K)', 'Activation Gibbs (J/mol)', 'Activation enthalpy (J/mol)',
+              'Activation entropy (J/mol/K)', 'k forward', 'k reverse', 'K equilibrium']
+    table = np.stack([results[name] for name in columns], axis=-1)
+    equations = [reactions.format_reaction(reaction) for reaction in network.reactions]
+    def get_rows():
+        yield header
+        for index, reaction in enumerate(network.reactions):
+            for temperature_index, temperature in enumerate(temperatures):
+                yield [reaction.label, equations[index], float(temperature)] + \
+                    [float(value) if np.isfinite(value) else '' for value in table[temperature_index, index]]
+    out_file = path + '/reactions_' + str(datetime.datetime.now().date()) + '.' + output_format
+    write_rows(out_file, get_rows(), [('Pressure:', pressure)])
+    print('{} reactions at {} temperatures written to {}'.format(len(network.reactions), temperatures.size, out_file))
+    return out_file
+
+
+# options of the thermochemistry model of a log file, as recorded with its results in a ResultsStore
+def get_model_options(file, pressure, job = 'last_freq'):
+    argument, mass_mobile_species = build_argument(is_gas=is_gas_species(file), pressure=pressure)
+    return {'apply_qrrho': argument['apply_qrrho'], 'rotation': argument['rotation'],
+            'translation': argument['translation'], 'job': job}
+
+
+# values (see SpeciesResult) of the log files whose results at temperature and pressure are in store and still valid
+def get_stored_values(store, log_files, temperature, pressure, job = 'last_freq'):
+    stored_values = dict()
+    for file in log_files:
+        values = store.get_values(file, temperature, pressure, get_model_options(file, pressure, job))
+        if values is not None:
+            stored_values[file] = dict(zip(RESULT_KEYS, [values[name] for name in RESULT_VALUES]))
+    return stored_values
+
+
+# SpeciesResults of every log file in the order of log_files: from stored_values (see get_stored_values) if there, else
+# the next of results (SpeciesResults of the other log files, in order), whose values are then added to store.
+# hash_cache_file: optional LogCache file (with use_hash) whose hashes of the logs are stored with the results. It is
+# opened only once results are exhausted: a connection opened before the process pool of the workers starts would be
+# inherited by them
+def merge_stored_results(log_files, stored_values, results, store, temperature, pressure, job = 'last_freq',
+                         hash_cache_file = None):
+    results = iter(results)
+    computed_results = []
+    try:
+        for file in log_files:
+            if file in stored_values:
+                yield SpeciesResult(get_species_name(file), file, stored_values[file], None, None)
+                continue
+            result = next(results)
+            if result.error is None:
+                computed_results.append((file, result))
+            yield result
+        hash_cache = LogCache(hash_cache_file, use_hash=True) if hash_cache_file and computed_results else None
+        try:
+            for file, result in computed_results:
+                content_hash = hash_cache.get_content_hash(file) if hash_cache is not None else None
+                store.store_values(file, result.species, temperature, pressure, get_model_options(file, pressure, job),
+                                   dict(zip(RESULT_VALUES, [result.values[key] for key in RESULT_KEYS])), content_hash)
+        finally:
+            if hash_cache is not None:
+                hash_cache.close()
+    finally:
+        store.commit()
+
+
+def get_output_files(path, output_format):
+    time_stamp = datetime.datetime.now()
+    out_file_SI = path + '/thermochemistry_all_species_SI-units_' + str(time_stamp.date()) + '.' + output_format
+    out_file_kcal = path + '/thermochemistry_all_species_KCAL_' + str(time_stamp.date()) + '.' + output_format
+    return out_file_SI, out_file_kcal
+
+
+# write the SI and kcal tables from an iterable of (row_SI, row_kcal), one row at a time. log_files (same order as rows)
+# are only used to print the progress. Returns the number of rows and of errors
+def write_tables(path, rows, temperature, pressure, output_format = 'xlsx', log_files = None):
+    out_file_SI, out_file_kcal = get_output_files(path, output_format)
+    conditions = [('Temperature:', temperature), ('Pressure:', pressure)]
+    writer_SI = open_row_writer(out_file_SI, conditions)
+    writer_kcal = open_row_writer(out_file_kcal, conditions)
+    number_of_rows = 0
+    number_of_errors = 0
+    try:
+        writer_SI.write_row(HEADER_SI)
+        writer_kcal.write_row(HEADER_KCAL)
+        for index, (row_SI, row_kcal) in enumerate(rows):
+            number_of_rows += 1
+            if len(row_SI) > 6:
+                number_of_errors += 1
+            if log_files is not None:
+                if len(row_SI) > 6:
+                    status = row_SI[-1]
+                elif is_gas_species(log_files[index]):
+                    status = 'ideal gas'
+                else:
+                    status = 'adsorbed, vibrational degrees of freedom only'
+                print('[{}/{}] {} ({})'.format(index + 1, len(log_files), log_files[index], status))
+            writer_SI.write_row(row_SI)
+            writer_kcal.write_row(row_kcal)
+    finally:
+        writer_SI.close()
+        writer_kcal.close()
+    return number_of_rows, number_of_errors
+
+
+# options: keyword arguments of parse_log.
+# output_format: one of WRITER_FORMATS. Rows are written as species finish so memory stays bounded for large batches
+# vectorized: evaluate all species at once with ThermochemistryBatch instead of one by one
+# prefetch: number of logs read ahead by threads while a log is evaluated (one worker only, 0 for none) in blocks of
+# read_size bytes, see log_prefetch. simulated_latency: seconds added to every open and read
+# store_file: optional ResultsStore file. Results it holds for unchanged logs at this condition are reused, the others are
+# computed and added to it
+def __main__(path, temperature, pressure = 101325, workers = 1, output_format = 'xlsx', vectorized = False, prefetch = 0,
+             read_size = READ_SIZE, simulated_latency = 0.0, store_file = None, **options):
 
+    if os.path.isdir(path):
+        #folder supplied as argument
+        log_files = get_log_files(path)
+        start_time = time.time()
+        store = ResultsStore(store_file) if store_file else None
+        job = options.get('job', 'last_freq')
+        stored_values = get_stored_values(store, log_files, temperature, pressure, job) if store is not None else dict()
+        pending_log_files = [file for file in log_files if file not in stored_values]
+        prefetcher = None
+        if prefetch > 0 and options.get('scan_mode') == 'tail':
+            # the tail scan reads only the end of the logs, reading them ahead in full would cost more
+            print('Prefetch ignored with scan mode tail')
+        elif prefetch > 0 and workers <= 1:
+            # logs the cache will serve are not read at all
+            cached_log_files = []
+            if options.get('cache_file'):
+                log_cache = get_log_cache(options['cache_file'], options.get('use_hash', False))
+                cached_log_files = [file for file in pending_log_files if log_cache.is_cached(file, job)]
+            prefetcher = LogPrefetcher(pending_log_files, prefetch, read_size, simulated_latency, cached_log_files)
+        if vectorized:
+            results = evaluate_all_species_vectorized(pending_log_files, temperature, pressure, workers, prefetcher,
+                                                      **options)
+        else:
+            results = evaluate_all_species(pending_log_files, temperature, pressure, workers, prefetcher, **options)
+        if store is not None:
+            hash_cache_file = options.get('cache_file') if options.get('use_hash') else None
+            results = merge_stored_results(log_files, stored_values, results, store, temperature, pressure, job,
+                                           hash_cache_file)
+        error_counts = collections.Counter()
+        number_of_rows, number_of_errors = write_tables(path, get_rows_from_results(results, error_counts), temperature,
+                                                        pressure, output_format, log_files)
+        elapsed_time = time.time() - start_time
+        print('Processed {} log files ({} errors) in {:.2f} s with {} worker(s): {:.1f} logs/s'.format(
+            len(log_files), number_of_errors, elapsed_time, workers, len(log_files) / elapsed_time if elapsed_time else 0))
+        if error_counts:
+            print('Skipped log files by error: ' + ', '.join('{} {}'.format(error_type, count) for error_type, count in
+                                                           sorted(error_counts.items())))
+        if prefetcher is not None:
+            prefetcher.print_summary()
+        if store is not None:
+            print('{} results reused from {}, {} computed'.format(len(stored_values), store_file, len(pending_log_files)))
+            store.close()
+
+
+# process only the log files of path that are new or changed since the last refresh and that finished running, and
+# rewrite the tables from the rows kept in the manifest. Arguments as for __main__. Returns the number of logs processed
+def refresh(path, temperature, pressure = 101325, workers = 1, output_format = 'xlsx', vectorized = False,
+            manifest_file = None, **options):
+    start_time = time.time()
+    conditions = {'temperature': temperature, 'pressure': pressure, 'options': {key: value for key, value in
+                                                                                 options.items() if key != 'cache_file'}}
+    manifest = LogManifest(manifest_file or os.path.join(path, MANIFEST_FILE_NAME), conditions)
+    log_files = get_log_files(path)
+    removed_logs = manifest.remove_missing(log_files)
+    changed_logs = [log_file for log_file in log_files if manifest.is_changed(log_file)]
+    finished_logs = [log_file for log_file in changed_logs if is_log_finished(log_file)]
+    if vectorized:
+        results = evaluate_all_species_vectorized(finished_logs, temperature, pressure, workers, **options)
+    else:
+        results = evaluate_all_species(finished_logs, temperature, pressure, workers, **options)
+    for log_file, result in zip(finished_logs, results):
+        manifest.record(log_file, list(get_result_rows(result)))
+    if finished_logs or removed_logs or not os.path.isfile(get_output_files(path, output_format)[0]):
+        manifest.save()
+        write_tables(path, manifest.get_rows(), temperature, pressure, output_format)
+    elif manifest.is_dirty:
+        manifest.save()
+    print('Refreshed in {:.1f} ms: {} new or changed log files processed, {} still running, {} removed, {} in tables'
+          .format(1000 * (time.time() - start_time), len(finished_logs), len(changed_logs) - len(finished_logs),
+                  len(removed_logs), len(manifest.entries)))
+    return len(finished_logs)
+
+
+# conditions of a sharded run, recorded with every partial result so that only results computed alike are merged. Only
+# the options changing the results count: nodes may use their own cache, hashing or scan mode
+def get_shard_conditions(temperature, pressure, job = 'last_freq', vectorized = False):
+    return {'temperature': temperature, 'pressure': pressure, 'job': job, 'vectorized': vectorized}
+
+
+# on_parsed: see evaluate_all_species_vectorized, used if vectorized
+def evaluate_log_files(log_files, temperature, pressure, workers = 1, vectorized = False, on_parsed = None, **options):
+    if vectorized:
+        return evaluate_all_species_vectorized(log_files, temperature, pressure, workers, on_parsed=on_parsed,
+                                               **options)
+    return evaluate_all_species(log_files, temperature, pressure, workers, **options)
+
+
+# evaluate the log files of path in shard shard_index of shard_count (see log_shards.get_shard_index) and write their
+# results to a partial result file in shard_folder (default: SHARD_FOLDER_NAME in path), to be merged by merge_shards.
+# Every node runs one shard. Returns the number of logs evaluated
+def run_shard(path, temperature, pressure, shard_index, shard_count, workers = 1, vectorized = False,
+              shard_folder = None, **options):
+    start_time = time.time()
+    shard_folder = shard_folder or os.path.join(path, SHARD_FOLDER_NAME)
+    log_files = get_shard_log_files(get_log_files(path), shard_index, shard_count)
+    results = evaluate_log_files(log_files, temperature, pressure, workers, vectorized, **options)
+    records = [result._asdict() for result in results]
+    part_file = write_part(shard_folder, 'shard-{}-of-{}'.format(shard_index, shard_count),
+                           get_shard_conditions(temperature, pressure, options.get('job', 'last_freq'), vectorized),
+                           records)
+    print('Shard {}/{}: {} log files evaluated in {:.2f} s, written to {}'.format(
+        shard_index, shard_count, len(log_files), time.time() - start_time, part_file))
+    return len(log_files)
+
+
+# pull chunks of log files from the work queue in shard_folder (default: SHARD_FOLDER_NAME in path) until none is left,
+# writing the results of every chunk to a partial result file. Run as many of these as wanted, on any node sharing the
+# folder; chunks of crashed workers are reclaimed after stale_seconds. The claim of a chunk is refreshed after every log
+# (parsed, if vectorized), so stale_seconds must exceed the time one log takes. Returns the number of chunks evaluated
+def run_queue_worker(path, temperature, pressure, workers = 1, vectorized = False, shard_folder = None,
+                     chunk_size = CHUNK_SIZE, stale_seconds = STALE_CLAIM_SECONDS, **options):
+    start_time = time.time()
+    shard_folder = shard_folder or os.path.join(path, SHARD_FOLDER_NAME)
+    conditions = get_shard_conditions(temperature, pressure, options.get('job', 'last_freq'), vectorized)
+    queue = WorkQueue(shard_folder, path, get_log_files(path), conditions, chunk_size, stale_seconds)
+    number_of_chunks = 0
+    while True:
+        chunk_index = queue.claim()
+        if chunk_index is None:
+            break
+        records = []
+        # the claim of this chunk, refreshed after every log
+        def refresh_claim(file):
+            queue.refresh_claim(chunk_index)
+        for result in evaluate_log_files(queue.get_log_files(chunk_index), temperature, pressure, workers, vectorized,
+                                         refresh_claim, **options):
+            records.append(result._asdict())
+            queue.refresh_claim(chunk_index)
+        queue.complete(chunk_index, conditions, records)
+        number_of_chunks += 1
+    done, claimed, pending = queue.get_progress()
+    print('Worker {}: {} chunks evaluated in {:.2f} s. Queue: {} of {} chunks done, {} claimed by other workers'.format(
+        queue.worker_id, number_of_chunks, time.time() - start_time, done, len(queue.chunks), claimed))
+    return number_of_chunks
+
+
+# write the tables of path from the partial results in shard_folder (default: SHARD_FOLDER_NAME in path), in the order
+# of the log file names whatever the shards or chunks they came from. Partial results computed at other conditions are
+# ignored, and no tables are written (InvalidOptionError) if none was computed at these conditions. Returns the number
+# of log files of path without results (not evaluated yet)
+def merge_shards(path, temperature, pressure, output_format = 'xlsx', vectorized = False, shard_folder = None,
+                 **options):
+    shard_folder = shard_folder or os.path.join(path, SHARD_FOLDER_NAME)
+    conditions = get_shard_conditions(temperature, pressure, options.get('job', 'last_freq'), vectorized)
+    records, skipped_parts = read_parts(shard_folder, conditions)
+    if not records:
+        raise InvalidOptionError('no partial results in {} were computed at {} K, {} Pa, job {}{} ({} at other '
+                                 'conditions). No tables written'.format(shard_folder, temperature, pressure,
+                                                                         conditions['job'],
+                                                                         ', vectorized' if vectorized else '',
+                                                                         len(skipped_parts)))
+    results = [SpeciesResult(**record) for record in records]
+    error_counts = collections.Counter()
+    number_of_rows, number_of_errors = write_tables(path, get_rows_from_results(results, error_counts), temperature,
+                                                    pressure, output_format)
+    merged_logs = set(os.path.basename(result.log_file) for result in results)
+    missing_logs = [log_file for log_file in get_log_files(path) if os.path.basename(log_file) not in merged_logs]
+    print('Merged the results of {} log files ({} errors) from {}'.format(number_of_rows, number_of_errors, shard_folder))
+    if skipped_parts:
+        print('Ignored {} partial results computed at other conditions: {}'.format(len(skipped_parts),
+                                                                                   ', '.join(skipped_parts)))
+    if missing_logs:
+        print('{} log files have no results yet, e.g. {}'.format(len(missing_logs), missing_logs[0]))
+    return len(missing_logs)
+
+
+# refresh every interval seconds until interrupted
+def watch(path, temperature, pressure = 101325, interval = 10.0, **options):
+    print('Watching {} every {} s. Interrupt with Ctrl-C'.format(path, interval))
+    try:
+        while True:
+            refresh(path, temperature, pressure, **options)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print('Stopped watching {}'.format(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Enter')
+
+    parser.add_argument('path', type=str, default=None,
+                        help='Name of folder with log files from Gaussian')
+    parser.add_argument('-t', '--temperature', type =float, default = 120.0,
+                        help = 'Temperature is degree Celsius for applying thermal corrections')
+    parser.add_argument('-p', '--pressure',type = float, default = 1.0,
+                        help = 'Pressure in atmospheres')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes evaluating log files in parallel')
+    parser.add_argument('-c', '--cache', nargs='?', default=None, const='',
+                        help='Cache the data parsed from the log files in this file (default: {} in the folder) '
+                             'so that unchanged logs are not parsed again'.format(CACHE_FILE_NAME))
+    parser.add_argument('--cache-hash', action='store_true',
+                        help='Also validate cached entries against a hash of the log file contents')
+    parser.add_argument('-s', '--scan-mode', choices=SCAN_MODES, default='stream',
+                        help='Read log files line by line (stream), memory mapped (mmap, faster on large logs) or '
+                             'backwards from the end up to the last complete freq job (tail, fastest on long '
+                             'optimizations, full scan if that job lacks data)')
+    parser.add_argument('-j', '--job', type=lambda job: job if job == 'last_freq' else int(job), default='last_freq',
+                        help='Job of multi-job (--Link1--) logs to evaluate: an index (0 is the first job, -1 the last) '
+                             'or last_freq for the last complete job with frequencies')
+    parser.add_argument('-o', '--output-format', choices=WRITER_FORMATS, default='xlsx',
+                        help='Format of the output tables')
+    parser.add_argument('-v', '--vectorized', action='store_true',
+                        help='Evaluate all species in one vectorized pass once the log files are parsed')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Only process log files that are new or changed since the last incremental run and have '
+                             'finished running, and update the tables (kept in {} in the folder)'.format(MANIFEST_FILE_NAME))
+    parser.add_argument('--watch', type=float, default=None, metavar='INTERVAL',
+                        help='Keep running and refresh incrementally every INTERVAL seconds')
+    parser.add_argument('-n', '--nasa', action='store_true',
+                        help='Also fit NASA polynomials to all species and write them to a Chemkin thermo file')
+    parser.add_argument('--nasa-temperatures', type=float, nargs=3, metavar=('T_LOW', 'T_MID', 'T_HIGH'),
+                        help='Temperatures (K) bounding the two ranges of the NASA polynomials '
+                             '(default: 298.15 1000 2000)')
+    parser.add_argument('-r', '--reactions', default=None, metavar='FILE',
+                        help='Also evaluate the reactions of this file ("label: A + 2 B -> C" or "A + B -> TS -> C" per '
+                             'line, over the species names of the folder) and write their thermochemistry and rate '
+                             'constants to a table')
+    parser.add_argument('--reaction-temperatures', type=float, nargs=3, default=None,
+                        metavar=('T_LOW', 'T_HIGH', 'NUMBER'),
+                        help='Evaluate the reactions at NUMBER temperatures (K) from T_LOW to T_HIGH (default: the '
+                             'temperature of the tables)')
+    parser.add_argument('--prefetch', type=int, default=0, metavar='DEPTH',
+                        help='Read up to DEPTH log files ahead in background threads while a log is evaluated (with one '
+                             'worker; useful on network filesystems). Logs served by the cache are not read ahead and '
+                             'the option is ignored with scan mode tail. Default 0 (off), e.g. {}'.format(PREFETCH_DEPTH))
+    parser.add_argument('--read-size', type=int, default=READ_SIZE,
+                        help='Bytes per read call of the prefetch threads')
+    parser.add_argument('--simulated-latency', type=float, default=0.0, metavar='SECONDS',
+                        help='Add this latency to every open and read of the prefetch threads, to tune the prefetch '
+                             'depth and read size on a local folder')
+    parser.add_argument('--store', nargs='?', default=None, const='',
+                        help='Keep the results of every species at every condition in this SQLite store (default: {} '
+                             'in the folder), reusing those already computed for unchanged logs. A log is unchanged if '
+                             'its size and modification time are, unless --cache is given with --cache-hash: the hash '
+                             'of its contents is then stored too, and a log merely touched is still reused'
+                        .format(RESULTS_FILE_NAME))
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                        help='Evaluate only shard I of N of the log files (by hash of their names) and write the results '
+                             'to a partial result file, to be combined with --merge. Run one shard per node')
+    parser.add_argument('--queue', action='store_true',
+                        help='Pull chunks of log files from a work queue shared by any number of workers (on any node) '
+                             'and write the results of every chunk to a partial result file, to be combined with --merge')
+    parser.add_argument('--merge', action='store_true',
+                        help='Write the tables from the partial results of --shard or --queue runs')
+    parser.add_argument('--shard-dir', default=None, metavar='FOLDER',
+                        help='Shared folder of the work queue and partial results (default: {} in the folder)'.format(
+                            SHARD_FOLDER_NAME))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Log files per chunk of the work queue')
+    parser.add_argument('--stale-claim', type=float, default=STALE_CLAIM_SECONDS, metavar='SECONDS',
+                        help='Reclaim chunks of the work queue whose worker gave no sign of life for this long. '
+                             'Workers refresh their claim after every log, so this must exceed the time one log takes')
+    parser.add_argument('--profile-summary', default=None, metavar='FILE',
+                        help='Record the time of every stage, the bytes read, the log file opens and the cache hit rate '
+                             'and write the summary to this json file')
+    parser.add_argument('--profile-dir', default=None, metavar='FOLDER',
+                        help='Also write a cProfile dump (readable with pstats) of every species to this folder')
+    command_args =  parser.parse_args()
+    if command_args.chunk_size < 1:
+        parser.error('chunk size should be 1 or more')
+    path = command_args.path
+    temperature = command_args.temperature + 273.15 #convert to Kelvin
+    pressure = command_args.pressure *c.ATM_TO_PASCAL #convert to Pascal
+    cache_file = command_args.cache
+    if cache_file == '':
+        cache_file = os.path.join(path, CACHE_FILE_NAME)
+    if command_args.profile_summary or command_args.profile_dir:
+        instrumentation.enable(command_args.profile_dir)
+    arguments = dict(path=path, temperature=temperature, pressure=pressure, workers=command_args.workers,
+                     cache_file=cache_file, use_hash=command_args.cache_hash, scan_mode=command_args.scan_mode,
+                     output_format=command_args.output_format, vectorized=command_args.vectorized, job=command_args.job)
+    # a missing optional writer module (xlsxwriter, pyarrow) or a bad option ends the run with its message
+    try:
+        if command_args.watch is not None:
+            watch(interval=command_args.watch, **arguments)
+        elif command_args.incremental:
+            refresh(**arguments)
+        elif command_args.shard or command_args.queue or command_args.merge:
+            output_format = arguments.pop('output_format')
+            if command_args.shard:
+                run_shard(shard_index=command_args.shard[0], shard_count=command_args.shard[1],
+                          shard_folder=command_args.shard_dir, **arguments)
+            if command_args.queue:
+                run_queue_worker(shard_folder=command_args.shard_dir, chunk_size=command_args.chunk_size,
+                                 stale_seconds=command_args.stale_claim, **arguments)
+            if command_args.merge:
+                del arguments['workers']
+                merge_shards(output_format=output_format, shard_folder=command_args.shard_dir, **arguments)
+        else:
+            store_file = command_args.store
+            if store_file == '':
+                store_file = os.path.join(path, RESULTS_FILE_NAME)
+            __main__(prefetch=command_args.prefetch, read_size=command_args.read_size,
+                     simulated_latency=command_args.simulated_latency, store_file=store_file, **arguments)
+        if command_args.nasa:
+            write_nasa_polynomials(path, pressure, workers=command_args.workers,
+                                   nasa_temperatures=command_args.nasa_temperatures, cache_file=cache_file,
+                                   use_hash=command_args.cache_hash, scan_mode=command_args.scan_mode,
+                                   job=command_args.job)
+        if command_args.reactions:
+            if command_args.reaction_temperatures is None:
+                reaction_temperatures = [temperature]
+            else:
+                import numpy as np
+                temperature_low, temperature_high, number = command_args.reaction_temperatures
+                reaction_temperatures = np.linspace(temperature_low, temperature_high, max(1, int(number)))
+            try:
+                write_reactions(path, command_args.reactions, reaction_temperatures, pressure,
+                                workers=command_args.workers, output_format=command_args.output_format,
+                                cache_file=cache_file, use_hash=command_args.cache_hash,
+                                scan_mode=command_args.scan_mode, job=command_args.job)
+            except (ThermochemistryError, OSError) as error:
+                # a bad reaction file does not discard the tables written above
+                print('Reactions of {} not evaluated: {}'.format(command_args.reactions, error))
+    except (ImportError, InvalidOptionError) as error:
+        parser.exit(-1, '{}. Exiting\n'.format(error))
+    if instrumentation.is_enabled():
+        instrumentation.print_summary()
+        if command_args.profile_summary:
+            instrumentation.write_summary(command_args.profile_summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+'''@Author: Himaghna
+   Description: opt-in instrumentation of the thermochemistry pipeline. Records the wall time of every stage (parsing,
+                thermochemistry, writing the tables, ...), counters (bytes read, log file opens, cache hits and misses)
+                and optionally dumps a cProfile of every species, so that slow batches can be broken down.
+                Disabled by default: every hook then costs a single check. Each process keeps its own records; the
+                workers of a process pool send theirs back with their results (see call_instrumented) to be merged'''
+import os
+import json
+import time
+import functools
+import collections
+
+# Instrumentation of this process while enabled, else None
+recorder = None
+
+
+class Instrumentation:
+    # profile_folder: folder the cProfile dumps of the species are written to, or None for no profiling
+    def __init__(self, profile_folder = None):
+        self.profile_folder = profile_folder
+        self.start_time = time.perf_counter()
+        self.stage_seconds = collections.Counter()
+        self.stage_calls = collections.Counter()
+        self.counters = collections.Counter()
+        # log file -> number of times it was opened
+        self.file_opens = collections.Counter()
+
+    def add_stage(self, name, seconds):
+        self.stage_seconds[name] += seconds
+        self.stage_calls[name] += 1
+
+    # raw records, json serializable and accepted by merge
+    def to_dict(self):
+        return {'stage_seconds': dict(self.stage_seconds), 'stage_calls': dict(self.stage_calls),
+                'counters': dict(self.counters), 'file_opens': dict(self.file_opens)}
+
+    # add the records (as returned by to_dict) of another process
+    def merge(self, records):
+        self.stage_seconds.update(records['stage_seconds'])
+        self.stage_calls.update(records['stage_calls'])
+        self.counters.update(records['counters'])
+        self.file_opens.update(records['file_opens'])
+
+    def get_summary(self):
+        cache_lookups = self.counters['cache_hits'] + self.counters['cache_misses']
+        opens_per_log = list(self.file_opens.values())
+        stages = dict()
+        for name in sorted(self.stage_seconds, key=self.stage_seconds.get, reverse=True):
+            stages[name] = {'seconds': self.stage_seconds[name], 'calls': self.stage_calls[name],
+                            'mean_seconds': self.stage_seconds[name] / self.stage_calls[name]}
+        return {'wall_seconds': time.perf_counter() - self.start_time, 'stages': stages,
+                'counters': dict(self.counters),
+                'cache_hit_rate': self.counters['cache_hits'] / cache_lookups if cache_lookups else None,
+                'file_opens_per_log': {'logs': len(opens_per_log), 'total': sum(opens_per_log),
+                                       'mean': sum(opens_per_log) / len(opens_per_log) if opens_per_log else 0,
+                                       'max': max(opens_per_log, default=0)},
+                'profile_folder': self.profile_folder}
+
+
+def enable(profile_folder = None):
+    global recorder
+    if profile_folder:
+        os.makedirs(profile_folder, exist_ok=True)
+    recorder = Instrumentation(profile_folder)
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = None
+
+
+def is_enabled():
+    return recorder is not None
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        if recorder is not None:
+            recorder.add_stage(self.name, time.perf_counter() - self.start_time)
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+# context timing a stage of the pipeline. Stages may nest, each records its own wall time
+def stage(name):
+    if recorder is None:
+        return NULL_STAGE
+    return Stage(name)
+
+
+# decorator timing every call of a function (or method) as a stage
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if recorder is None:
+                return function(*args, **kwargs)
+            with Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value = 1):
+    if recorder is not None:
+        recorder.counters[name] += value
+
+
+def count_file_open(file):
+    if recorder is not None:
+        recorder.counters['file_opens'] += 1
+        recorder.file_opens[file] += 1
+
+
+class Profile:
+    def __init__(self, out_file):
+        import cProfile
+        self.out_file = out_file
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.out_file)
+
+
+# context writing a cProfile dump (readable with pstats) of the work done for one species to <profile folder>/name.prof,
+# if profiling is enabled
+def profile(name):
+    if recorder is None or not recorder.profile_folder:
+        return NULL_STAGE
+    return Profile(os.path.join(recorder.profile_folder, name + '.prof'))
+
+
+# run function(*args) in a worker process with instrumentation enabled and return its result and the records of the
+# call, to be merged in the parent process with merge_result. Use with functools.partial(call_instrumented, function,
+# profile_folder)
+def call_instrumented(function, profile_folder, *args):
+    enable(profile_folder)
+    try:
+        result = function(*args)
+        return result, recorder.to_dict()
+    finally:
+        disable()
+
+
+def merge_result(instrumented_result):
+    result, records = instrumented_result
+    if recorder is not None:
+        recorder.merge(records)
+    return result
+
+
+def get_summary():
+    return recorder.get_summary() if recorder is not None else None
+
+
+def print_summary():
+    summary = get_summary()
+    print('\n{:50s} {:>12s} {:>8s}'.format('stage', 'seconds', 'calls'))
+    for name, stage_summary in summary['stages'].items():
+        print('{:50s} {:12.6f} {:8d}'.format(name, stage_summary['seconds'], stage_summary['calls']))
+    print('Bytes read: {}, file opens: {} ({:.1f} per log), cache hit rate: {}'.format(
+        summary['counters'].get('bytes_read', 0), summary['file_opens_per_log']['total'],
+        summary['file_opens_per_log']['mean'],
+        '{:.1%}'.format(summary['cache_hit_rate']) if summary['cache_hit_rate'] is not None else 'no cache'))
+
+
+def write_summary(out_file):
+    with open(out_file, 'w') as fp:
+        json.dump(get_summary(), fp, indent=2)
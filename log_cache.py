@@ -0,0 +1,93 @@
+'''@Author: Himaghna
+   Description: persistent SQLite cache of the quantities parsed from Gaussian log files. Entries are keyed by the absolute
+                path of the log and validated against its size and modification time (and optionally a hash of its contents)
+                so that a changed log is parsed again while repeat runs at new conditions never read unchanged logs'''
+import os
+import json
+import hashlib
+import sqlite3
+try:
+    from . import instrumentation
+    from .Gaussian_log import GaussianLog, PARSED_DATA_VERSION
+except ImportError:
+    import instrumentation
+    from Gaussian_log import GaussianLog, PARSED_DATA_VERSION
+
+CACHE_FILE_NAME = '.gaussian_log_cache.sqlite'
+
+
+# sha1 of the contents of a file, read in blocks
+def get_file_hash(file, block_size = 1 << 20):
+    file_hash = hashlib.sha1()
+    instrumentation.count_file_open(file)
+    with open(file, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            file_hash.update(block)
+            instrumentation.count('bytes_hashed', len(block))
+    return file_hash.hexdigest()
+
+
+class LogCache:
+    # use_hash: also store and compare a hash of the log contents. Safer against files rewritten with the same size and
+    # mtime but a cache hit then costs one read of the log (still no parsing)
+    def __init__(self, cache_file, use_hash = False):
+        self.cache_file = cache_file
+        self.use_hash = use_hash
+        self.hits = 0
+        self.misses = 0
+        # generous timeout and write ahead logging as several worker processes may share one cache file
+        self.connection = sqlite3.connect(cache_file, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS parsed_logs (path TEXT PRIMARY KEY, size INTEGER, '
+                                'mtime_ns INTEGER, content_hash TEXT, parsed_data TEXT)')
+        self.connection.commit()
+
+    # GaussianLog for log_file, from the cache if the log did not change since it was stored, else parsed (with
+    # scan_mode, see GaussianLog) and stored. job and log_data (bytes of the log if already read) are passed to GaussianLog
+    @instrumentation.timed('cache:get_parsed_log')
+    def get_parsed_log(self, log_file, scan_mode = 'stream', job = 'last_freq', log_data = None):
+        path = os.path.abspath(log_file)
+        stat = os.stat(path)
+        content_hash = get_file_hash(path) if self.use_hash else None
+        parsed_data = self.get_valid_entry(path, stat, job)
+        if parsed_data is not None and (not self.use_hash or parsed_data['content_hash'] == content_hash):
+            self.hits += 1
+            instrumentation.count('cache_hits')
+            return GaussianLog(log_file, parsed_data=parsed_data['parsed_data'], job=job)
+        self.misses += 1
+        instrumentation.count('cache_misses')
+        parsed_log = GaussianLog(log_file, scan_mode=scan_mode, job=job, log_data=log_data)
+        self.connection.execute('INSERT OR REPLACE INTO parsed_logs VALUES (?, ?, ?, ?, ?)',
+                                (path, stat.st_size, stat.st_mtime_ns, content_hash, json.dumps(parsed_log.to_dict())))
+        self.connection.commit()
+        return parsed_log
+
+    # {'content_hash': ..., 'parsed_data': ...} of the entry of path if its size and modification time are those of stat
+    # and it can serve job, else None. Entries written by an older parser are parsed again, as are entries indexed from
+    # the tail of the log only (scan mode 'tail') when another job than 'last_freq' is asked for
+    def get_valid_entry(self, path, stat, job = 'last_freq'):
+        row = self.connection.execute('SELECT size, mtime_ns, content_hash, parsed_data FROM parsed_logs WHERE path = ?',
+                                      (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        parsed_data = json.loads(row[3])
+        if parsed_data.get('version') != PARSED_DATA_VERSION or \
+                (job != 'last_freq' and parsed_data.get('index_start_offset')):
+            return None
+        return {'content_hash': row[2], 'parsed_data': parsed_data}
+
+    # True if get_parsed_log will probably serve log_file from the cache, judged from its size and modification time
+    # only (the log is not read even with use_hash). Used to avoid reading ahead logs that will not be parsed
+    def is_cached(self, log_file, job = 'last_freq'):
+        path = os.path.abspath(log_file)
+        return self.get_valid_entry(path, os.stat(path), job) is not None
+
+    # hash of the contents of log_file stored with its (still valid) entry, or None if there is none or the cache does
+    # not use hashes
+    def get_content_hash(self, log_file):
+        path = os.path.abspath(log_file)
+        parsed_data = self.get_valid_entry(path, os.stat(path))
+        return parsed_data['content_hash'] if parsed_data is not None else None
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,176 @@
+'''@Author: Himaghna
+   Description: extraction of any number of named quantities from Gaussian log files in one pass per file. The patterns are
+                joined into a single compiled regular expression (one alternative per pattern) which is run over blocks of
+                whole lines to find the few lines where any pattern may match; every pattern then runs on those lines
+                only, so extracting 20 quantities reads and scans every log once instead of 20 times.
+                Folders are processed in parallel and the result is a table with one row per log file
+   Call type: log_extract.py folder -p "zpe=Zero-point vibrational energy *([-.0-9]+)" -o out.csv'''
+import re
+import argparse
+import functools
+try:
+    from .Gaussian_log import get_log_files, get_log_name, open_log
+    from .result_writers import write_rows
+    from .thermo_errors import InvalidOptionError
+except ImportError:
+    from Gaussian_log import get_log_files, get_log_name, open_log
+    from result_writers import write_rows
+    from thermo_errors import InvalidOptionError
+
+# lines of the log are scanned in blocks of about this many bytes. Patterns match within a line
+BLOCK_SIZE = 1 << 20
+OCCURRENCES = ('first', 'last', 'all')
+# value of a quantity that is absent from the log
+MISSING_VALUE = 'NaN'
+
+
+# backreferences (\1, (?P=name)) and conditional groups ((?(1)...)) not preceded by an escaped backslash
+REFERENCE_PATTERN = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?P=|\(\?\()')
+
+
+# compiled pattern, if it can be joined with others into one expression: groups are renumbered in the combined expression
+# and flags set inline for the whole expression would apply to every pattern (or not compile), so backreferences, named
+# groups and global inline flags ((?i) but not the scoped (?i:...)) are rejected with InvalidOptionError
+def check_pattern(name, pattern):
+    try:
+        compiled_pattern = re.compile(pattern)
+    except re.error as error:
+        raise InvalidOptionError('invalid expression of pattern {}: {}'.format(name, error))
+    if REFERENCE_PATTERN.search(pattern):
+        raise InvalidOptionError('pattern {} should not hold backreferences or conditional groups'.format(name))
+    if compiled_pattern.groupindex:
+        raise InvalidOptionError('pattern {} should not hold named groups'.format(name))
+    if compiled_pattern.flags & ~re.UNICODE:
+        raise InvalidOptionError('pattern {} should not set global inline flags such as (?i); use a scoped group such '
+                                 'as (?i:...) instead'.format(name))
+    return compiled_pattern
+
+
+# patterns: dictionary name -> regular expression (see check_pattern). The value of a match is the first group of the
+# expression if it has one, else the whole match. Returns the combined expression (bytes), which finds the lines where
+# any pattern may match, and (name, compiled expression, index of the value group) of every pattern
+@functools.lru_cache(maxsize=None)
+def compile_patterns(patterns):
+    compiled_patterns = []
+    for name, pattern in patterns:
+        number_of_groups = check_pattern(name, pattern).groups
+        compiled_patterns.append((name, re.compile(pattern.encode(), re.MULTILINE), 1 if number_of_groups else 0))
+    combined_pattern = re.compile('|'.join('(?:{})'.format(pattern) for name, pattern in patterns).encode(),
+                                  re.MULTILINE)
+    return combined_pattern, compiled_patterns
+
+
+def to_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+# (start, end) of the runs of whole lines of block holding a match of combined_pattern, in order. Only one alternative
+# of the combined expression matches at a position, so these lines are only candidates for every pattern
+def get_candidate_spans(combined_pattern, block):
+    span_start = span_end = -1
+    for match in combined_pattern.finditer(block):
+        start = block.rfind(b'\n', 0, match.start()) + 1
+        end = block.find(b'\n', match.end())
+        end = len(block) if end == -1 else end
+        if start > span_end:
+            if span_end >= 0:
+                yield span_start, span_end
+            span_start = start
+        span_end = max(span_end, end)
+    if span_end >= 0:
+        yield span_start, span_end
+
+
+# dictionary name -> value of every pattern in log_file (plain or compressed). occurrence: keep the 'first' or 'last'
+# match of every pattern or a list of 'all' of them. Absent quantities are MISSING_VALUE ([] for 'all').
+# The log is scanned once with the combined expression; every pattern then runs on the candidate lines only, so
+# patterns matching overlapping text (e.g. a part of the match of another pattern) all get their values
+def extract_from_log(log_file, patterns, occurrence = 'last'):
+    if occurrence not in OCCURRENCES:
+        raise InvalidOptionError('"occurrence" should be one of {}'.format(OCCURRENCES))
+    combined_pattern, compiled_patterns = compile_patterns(tuple(patterns.items()))
+    values = {name: [] for name, compiled_pattern, group in compiled_patterns}
+    with open_log(log_file) as fp:
+        while True:
+            block = b''.join(fp.readlines(BLOCK_SIZE))
+            if not block:
+                break
+            for start, end in get_candidate_spans(combined_pattern, block):
+                for name, compiled_pattern, group in compiled_patterns:
+                    if occurrence == 'first' and values[name]:
+                        continue
+                    for match in compiled_pattern.finditer(block, start, end):
+                        values[name].append(to_value(match.group(group).decode(errors='replace').strip()))
+                        if occurrence == 'first':
+                            break
+    if occurrence == 'all':
+        return values
+    return {name: (matches[0] if occurrence == 'first' else matches[-1]) if matches else MISSING_VALUE
+            for name, matches in values.items()}
+
+
+# row of the table: log name followed by the value of every pattern, in the order of patterns
+def get_row(log_file, patterns, occurrence = 'last'):
+    values = extract_from_log(log_file, patterns, occurrence)
+    return [get_log_name(log_file)] + [values[name] for name in patterns]
+
+
+# header followed by one row per log file (in the order of log_files). workers > 1 processes the logs in parallel
+def extract_from_logs(log_files, patterns, workers = 1, occurrence = 'last'):
+    function = functools.partial(get_row, patterns=patterns, occurrence=occurrence)
+    table = [['Species'] + list(patterns)]
+    if workers > 1 and len(log_files) > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            table.extend(executor.map(function, log_files, chunksize=max(1, len(log_files) // (workers * 4))))
+    else:
+        table.extend(function(log_file) for log_file in log_files)
+    return table
+
+
+def extract_from_folder(folder, patterns, workers = 1, occurrence = 'last'):
+    return extract_from_logs(get_log_files(folder), patterns, workers, occurrence)
+
+
+# "name=expression" -> (name, expression)
+def parse_pattern_argument(argument):
+    name, separator, pattern = argument.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError('patterns should be given as name=expression')
+    try:
+        check_pattern(name, pattern)
+    except InvalidOptionError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    return name, pattern
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract named quantities from all Gaussian log files of a folder')
+    parser.add_argument('folder', help='Folder with the log files (plain or compressed)')
+    parser.add_argument('-p', '--pattern', action='append', type=parse_pattern_argument, required=True,
+                        help='name=expression. The first group of the expression (else the whole match) is extracted. '
+                             'Can be repeated. The expressions are joined into one, so they cannot use backreferences, '
+                             'named groups or global inline flags such as (?i) (use (?i:...))')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output file (.xlsx, .csv, .parquet or .arrow). The table is printed if not given')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--occurrence', choices=OCCURRENCES, default='last',
+                        help='Keep the first, last or all matches of every pattern in a log')
+    command_args = parser.parse_args()
+    table = extract_from_folder(command_args.folder, dict(command_args.pattern), command_args.workers,
+                                command_args.occurrence)
+    if command_args.output is None:
+        for row in table:
+            print('\t'.join(str(value) for value in row))
+        return
+    try:
+        write_rows(command_args.output, table)
+    except (ImportError, InvalidOptionError) as error:
+        parser.exit(-1, '{}. Exiting\n'.format(error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''@Author: Himaghna
+   Description: manifest of the Gaussian log files of a folder that were already processed, with their size, modification
+                time and content hash and the result rows computed from them. Used to process only new or changed logs.
+                A log whose size and modification time did not change is not read at all; otherwise its hash decides'''
+import os
+import json
+try:
+    from .log_cache import get_file_hash
+    from .Gaussian_log import JOB_START_ANCHORS, is_compressed_log
+except ImportError:
+    from log_cache import get_file_hash
+    from Gaussian_log import JOB_START_ANCHORS, is_compressed_log
+
+MANIFEST_FILE_NAME = '.thermo_manifest.json'
+# Gaussian prints one of these at the end of every job. A log without one in its last block is still running
+TERMINATION_MARKERS = (b'Normal termination', b'Error termination')
+TAIL_BLOCK_SIZE = 4096
+
+
+# True if the last job of the log terminated (normally or with an error). Only the last block of the file is read: it must
+# hold a termination line that is not followed by the start of another (--Link1--) job. Compressed logs are archived and
+# so always finished
+def is_log_finished(log_file):
+    if is_compressed_log(log_file):
+        return True
+    with open(log_file, 'rb') as fp:
+        fp.seek(0, os.SEEK_END)
+        fp.seek(max(0, fp.tell() - TAIL_BLOCK_SIZE))
+        tail = fp.read()
+    last_termination = max(tail.rfind(marker) for marker in TERMINATION_MARKERS)
+    last_job_start = max(tail.rfind(anchor) for anchor in JOB_START_ANCHORS)
+    return last_termination != -1 and last_termination > last_job_start
+
+
+class LogManifest:
+    # conditions: json serializable description of how the rows were computed (e.g. temperature, pressure, options).
+    # A manifest saved with other conditions is discarded so that every log is processed again
+    def __init__(self, manifest_file, conditions = None):
+        self.manifest_file = manifest_file
+        self.conditions = conditions
+        self.entries = dict()
+        # True once an entry was refreshed in memory (see is_changed) and the manifest should be saved
+        self.is_dirty = False
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as fp:
+                saved_manifest = json.load(fp)
+            if saved_manifest.get('conditions') == conditions:
+                self.entries = saved_manifest['entries']
+
+    # True if log_file is not in the manifest or changed since it was recorded. The stored size and modification time
+    # are refreshed if only they changed (e.g. the log was touched or copied), which marks the manifest dirty so that it is
+    # saved and the log is not hashed again by the next refresh
+    def is_changed(self, log_file):
+        entry = self.entries.get(log_file)
+        if entry is None:
+            return True
+        stat = os.stat(log_file)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return False
+        if entry['size'] == stat.st_size and entry['hash'] == get_file_hash(log_file):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.is_dirty = True
+            return False
+        return True
+
+    def record(self, log_file, rows):
+        stat = os.stat(log_file)
+        self.entries[log_file] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': get_file_hash(log_file),
+                                  'rows': rows}
+
+    # forget the logs that are not in log_files any more (deleted or renamed). Returns the forgotten logs
+    def remove_missing(self, log_files):
+        missing_logs = set(self.entries) - set(log_files)
+        for log_file in missing_logs:
+            del self.entries[log_file]
+        return sorted(missing_logs)
+
+    # rows of every recorded log in the order of the log file names
+    def get_rows(self):
+        return [self.entries[log_file]['rows'] for log_file in sorted(self.entries)]
+
+    # written to a temporary file first so that an interrupted save leaves the previous manifest intact
+    def save(self):
+        temporary_file = self.manifest_file + '.tmp'
+        with open(temporary_file, 'w') as fp:
+            json.dump({'conditions': self.conditions, 'entries': self.entries}, fp)
+        os.replace(temporary_file, self.manifest_file)
+        self.is_dirty = False
@@ -0,0 +1,106 @@
+'''@Author: Himaghna
+   Description: pipelined reading of Gaussian log files for slow (network) filesystems. A bounded pool of threads reads the
+                next logs of a batch into memory while the current one is parsed and evaluated, so that the open and read
+                latency of NFS/Lustre overlaps with the computation instead of adding to it. The time the consumer waited
+                for data (I/O wait) and the time it spent between logs (compute) are reported to tune the queue depth and
+                read size. A latency per open and per read can be simulated to tune the pipeline on a local folder'''
+import time
+import itertools
+import collections
+try:
+    from . import instrumentation
+    from .Gaussian_log import open_log
+except ImportError:
+    import instrumentation
+    from Gaussian_log import open_log
+
+PREFETCH_DEPTH = 4          # logs read ahead of the one being evaluated
+READ_SIZE = 1 << 20         # bytes per read call
+
+
+# (decompressed) bytes of a log file read in blocks of read_size and the time taken. simulated_latency: seconds slept
+# before the open and before every read, as on a high latency filesystem
+def read_log(log_file, read_size = READ_SIZE, simulated_latency = 0.0):
+    start_time = time.perf_counter()
+    if simulated_latency:
+        time.sleep(simulated_latency)
+    blocks = []
+    with open_log(log_file) as fp:
+        while True:
+            if simulated_latency:
+                time.sleep(simulated_latency)
+            block = fp.read(read_size)
+            if not block:
+                break
+            blocks.append(block)
+    return b''.join(blocks), time.perf_counter() - start_time
+
+
+class LogPrefetcher:
+    # iterate over it to get (log_file, bytes of the log) in the order of log_files, with up to depth logs read ahead by
+    # as many threads. At most depth logs are held in memory besides the one being evaluated. A log that cannot be read
+    # comes with None instead of its bytes, so that the consumer opens it itself and reports the error.
+    # skipped_log_files: logs not worth reading ahead (e.g. served by a cache), yielded with None without being read
+    def __init__(self, log_files, depth = PREFETCH_DEPTH, read_size = READ_SIZE, simulated_latency = 0.0,
+                 skipped_log_files = ()):
+        self.log_files = list(log_files)
+        self.skipped_log_files = set(skipped_log_files)
+        self.depth = max(1, depth)
+        self.read_size = read_size
+        self.simulated_latency = simulated_latency
+        self.io_wait_seconds = 0.0
+        # time spent by the threads reading, summed over threads
+        self.read_seconds = 0.0
+        self.elapsed_seconds = 0.0
+        self.bytes_read = 0
+        self.read_errors = 0
+
+    def __iter__(self):
+        import concurrent.futures
+        start_time = time.perf_counter()
+        log_files = iter(self.log_files)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.depth) as executor:
+            pending = collections.deque()
+            for log_file in itertools.islice(log_files, self.depth):
+                pending.append((log_file, self.submit(executor, log_file)))
+            while pending:
+                log_file, future = pending.popleft()
+                wait_start = time.perf_counter()
+                with instrumentation.stage('prefetch:io_wait'):
+                    try:
+                        log_data, read_seconds = future.result() if future is not None else (None, 0.0)
+                    except Exception:
+                        log_data, read_seconds = None, 0.0
+                        self.read_errors += 1
+                self.io_wait_seconds += time.perf_counter() - wait_start
+                self.read_seconds += read_seconds
+                if log_data is not None:
+                    self.bytes_read += len(log_data)
+                    instrumentation.count('bytes_read', len(log_data))
+                # the next log is requested before this one is handed over, keeping depth reads in flight
+                for next_log_file in itertools.islice(log_files, 1):
+                    pending.append((next_log_file, self.submit(executor, next_log_file)))
+                yield log_file, log_data
+                self.elapsed_seconds = time.perf_counter() - start_time
+
+    # future of the read of log_file, or None if it is skipped
+    def submit(self, executor, log_file):
+        if log_file in self.skipped_log_files:
+            return None
+        return executor.submit(read_log, log_file, self.read_size, self.simulated_latency)
+
+    # time between logs not spent waiting for data, i.e. parsing and evaluating them
+    def get_compute_seconds(self):
+        return self.elapsed_seconds - self.io_wait_seconds
+
+    def get_summary(self):
+        return {'depth': self.depth, 'read_size': self.read_size, 'simulated_latency': self.simulated_latency,
+                'logs': len(self.log_files), 'skipped_logs': len(self.skipped_log_files), 'bytes_read': self.bytes_read, 'read_errors': self.read_errors,
+                'io_wait_seconds': self.io_wait_seconds, 'compute_seconds': self.get_compute_seconds(),
+                'read_seconds': self.read_seconds, 'elapsed_seconds': self.elapsed_seconds}
+
+    def print_summary(self):
+        print('Prefetch depth {}, read size {} B: I/O wait {:.2f} s, compute {:.2f} s, reading {:.2f} s (threads), '
+              '{:.1f} MB read, {} read errors, {} logs not read ahead'.format(
+                  self.depth, self.read_size, self.io_wait_seconds, self.get_compute_seconds(), self.read_seconds,
+                  self.bytes_read / 1e6, self.read_errors, len(self.skipped_log_files)))
@@ -0,0 +1,215 @@
+'''@Author: Himaghna
+   Description: splitting the log files of a folder across independent nodes (or local processes) sharing a filesystem.
+                Either every node takes a fixed shard (hash of the log name modulo the number of shards) or all nodes
+                pull chunks of logs from a work queue: a manifest of chunks written once, claimed by creating a lock file
+                per chunk. Workers touch their claim file after every log, and a claim not touched for stale_seconds
+                (longer than one log takes, else a live worker loses its chunk) belongs to a crashed worker and is
+                reclaimed.
+                Every shard or chunk is written to a partial result file and the merge combines them in the order of
+                the log names, whatever the number of nodes and the order they finished in'''
+import os
+import json
+import time
+import socket
+import hashlib
+try:
+    from .thermo_errors import InvalidOptionError
+except ImportError:
+    from thermo_errors import InvalidOptionError
+
+SHARD_FOLDER_NAME = '.thermo_shards'
+CHUNK_SIZE = 64                 # logs per chunk of the work queue
+STALE_CLAIM_SECONDS = 600.0     # claims not refreshed for this long belong to crashed workers
+
+
+# 'i/N' -> (i, N) with 0 <= i < N
+def parse_shard(text):
+    try:
+        shard_index, shard_count = [int(number) for number in text.split('/')]
+    except ValueError:
+        raise InvalidOptionError('shard should read i/N, e.g. 0/4, not {}'.format(text))
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise InvalidOptionError('shard {} should have 0 <= i < N'.format(text))
+    return shard_index, shard_count
+
+
+# shard of a log file: hash of its file name (not the folder, which may be mounted elsewhere on other nodes) modulo
+# shard_count. Stable across runs, nodes and python versions unlike hash()
+def get_shard_index(log_file, shard_count):
+    return int(hashlib.md5(os.path.basename(log_file).encode()).hexdigest(), 16) % shard_count
+
+
+def get_shard_log_files(log_files, shard_index, shard_count):
+    return [log_file for log_file in log_files if get_shard_index(log_file, shard_count) == shard_index]
+
+
+# unique name of this worker process, recorded in its claims
+def get_worker_id():
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+# write data as json to a temporary file first so that readers never see a partial file
+def write_json(out_file, data):
+    temporary_file = '{}.{}.tmp'.format(out_file, get_worker_id())
+    with open(temporary_file, 'w') as fp:
+        json.dump(data, fp)
+    os.replace(temporary_file, out_file)
+
+
+def get_parts_folder(shard_folder):
+    return os.path.join(shard_folder, 'parts')
+
+
+# write the records (json serializable, each with a 'log_file' key) of one shard or chunk computed with conditions
+def write_part(shard_folder, part_name, conditions, records):
+    os.makedirs(get_parts_folder(shard_folder), exist_ok=True)
+    out_file = os.path.join(get_parts_folder(shard_folder), part_name + '.json')
+    write_json(out_file, {'conditions': conditions, 'records': records})
+    return out_file
+
+
+# records of all partial result files computed with conditions, sorted by the file name of their log. A log in several
+# parts (e.g. a chunk finished by a worker that was thought dead and by the worker that reclaimed it) is kept once.
+# Returns the records and the names of the parts skipped because they were computed with other conditions
+def read_parts(shard_folder, conditions):
+    records = dict()
+    skipped_parts = []
+    parts_folder = get_parts_folder(shard_folder)
+    part_names = sorted(name for name in os.listdir(parts_folder) if name.endswith('.json')) \
+        if os.path.isdir(parts_folder) else []
+    for part_name in part_names:
+        with open(os.path.join(parts_folder, part_name)) as fp:
+            part = json.load(fp)
+        if part['conditions'] != conditions:
+            skipped_parts.append(part_name)
+            continue
+        for record in part['records']:
+            records.setdefault(os.path.basename(record['log_file']), record)
+    return [records[name] for name in sorted(records)], skipped_parts
+
+
+class WorkQueue:
+    # queue of the log files of path in chunks of chunk_size, shared by every worker using the same shard_folder.
+    # The first worker writes the manifest of chunks (log file names); the others read it, so that all agree on the chunks
+    # even if logs are added meanwhile. A manifest written with other conditions is an error: remove the shard folder to
+    # start a new campaign
+    def __init__(self, shard_folder, path, log_files, conditions, chunk_size = CHUNK_SIZE,
+                 stale_seconds = STALE_CLAIM_SECONDS):
+        self.shard_folder = shard_folder
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.worker_id = get_worker_id()
+        self.claims_folder = os.path.join(shard_folder, 'claims')
+        os.makedirs(self.claims_folder, exist_ok=True)
+        os.makedirs(get_parts_folder(shard_folder), exist_ok=True)
+        manifest_file = os.path.join(shard_folder, 'manifest.json')
+        log_names = [os.path.basename(log_file) for log_file in log_files]
+        manifest = {'conditions': conditions,
+                    'chunks': [log_names[start:start + chunk_size] for start in range(0, len(log_names), chunk_size)]}
+        # a hard link to a complete temporary file creates the manifest only if there is none, atomically
+        temporary_file = '{}.{}.tmp'.format(manifest_file, self.worker_id)
+        with open(temporary_file, 'w') as fp:
+            json.dump(manifest, fp)
+        try:
+            os.link(temporary_file, manifest_file)
+        except FileExistsError:
+            with open(manifest_file) as fp:
+                manifest = json.load(fp)
+        finally:
+            os.remove(temporary_file)
+        if manifest['conditions'] != conditions:
+            raise InvalidOptionError('the work queue in {} was started with other conditions ({}). Merge or remove it '
+                                     'first'.format(shard_folder, manifest['conditions']))
+        self.chunks = manifest['chunks']
+
+    def get_part_name(self, chunk_index):
+        return 'chunk-{:06d}'.format(chunk_index)
+
+    def get_claim_file(self, chunk_index):
+        return os.path.join(self.claims_folder, self.get_part_name(chunk_index) + '.claim')
+
+    def is_done(self, chunk_index):
+        return os.path.isfile(os.path.join(get_parts_folder(self.shard_folder),
+                                           self.get_part_name(chunk_index) + '.json'))
+
+    # log files (under this worker's path) of a chunk
+    def get_log_files(self, chunk_index):
+        return [os.path.join(self.path, log_name) for log_name in self.chunks[chunk_index]]
+
+    # claim the first chunk that is neither done nor claimed by a live worker and return its index, or None if there is
+    # none left. Creating the claim file with O_EXCL is atomic, so a chunk is claimed by one worker only
+    def claim(self):
+        for chunk_index in range(len(self.chunks)):
+            if self.is_done(chunk_index):
+                continue
+            claim_file = self.get_claim_file(chunk_index)
+            if self.try_create_claim(claim_file):
+                return chunk_index
+            if self.reclaim_stale(claim_file) and self.try_create_claim(claim_file):
+                return chunk_index
+        return None
+
+    def try_create_claim(self, claim_file):
+        try:
+            descriptor = os.open(claim_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(descriptor, 'w') as fp:
+            fp.write(self.worker_id)
+        return True
+
+    # remove the claim of a crashed worker (not refreshed for stale_seconds). Of several workers finding the same stale
+    # claim one only takes it over: the one creating (with O_EXCL) a marker named after the inode and modification time
+    # of that claim. Markers are kept, else a worker that found the claim late could take it over again. Returns True if
+    # the claim was removed
+    def reclaim_stale(self, claim_file):
+        try:
+            stat = os.stat(claim_file)
+        except FileNotFoundError:
+            # released meanwhile
+            return False
+        if time.time() - stat.st_mtime < self.stale_seconds:
+            return False
+        claim_identity = (stat.st_ino, stat.st_mtime_ns)
+        if not self.try_create_claim('{}.{}-{}.takeover'.format(claim_file, *claim_identity)):
+            # taken over by another worker
+            return False
+        stale_file = '{}.{}.stale'.format(claim_file, self.worker_id)
+        try:
+            os.rename(claim_file, stale_file)
+        except FileNotFoundError:
+            return False
+        stat = os.stat(stale_file)
+        if (stat.st_ino, stat.st_mtime_ns) != claim_identity:
+            # the stale claim was released and the chunk claimed again meanwhile: give the new claim back
+            try:
+                os.link(stale_file, claim_file)
+            except FileExistsError:
+                pass
+            os.remove(stale_file)
+            return False
+        os.remove(stale_file)
+        print('Reclaimed stale claim {}'.format(claim_file))
+        return True
+
+    # show that the worker of a claim is alive. Call more often than every stale_seconds while processing the chunk
+    def refresh_claim(self, chunk_index):
+        try:
+            os.utime(self.get_claim_file(chunk_index))
+        except FileNotFoundError:
+            pass
+
+    # write the partial results of a claimed chunk and release it
+    def complete(self, chunk_index, conditions, records):
+        write_part(self.shard_folder, self.get_part_name(chunk_index), conditions, records)
+        try:
+            os.remove(self.get_claim_file(chunk_index))
+        except FileNotFoundError:
+            pass
+
+    # numbers of chunks done, claimed (by live or crashed workers) and pending
+    def get_progress(self):
+        done = sum(self.is_done(chunk_index) for chunk_index in range(len(self.chunks)))
+        claimed = sum(os.path.isfile(self.get_claim_file(chunk_index)) and not self.is_done(chunk_index)
+                      for chunk_index in range(len(self.chunks)))
+        return done, claimed, len(self.chunks) - done - claimed
@@ -0,0 +1,151 @@
+'''@Author: Himaghna
+   Description: two range NASA-7 polynomials fitted to the heat capacity, enthalpy and entropy of many species at once.
+                The thermochemistry of all species is evaluated on a dense temperature grid with ThermochemistryBatch and
+                the 14 coefficients of every species are fitted by one least squares solve with a right hand side per
+                species, constrained so that Cp, H and S are continuous at the middle temperature.
+                Enthalpies have the same reference as the thermochemistry tables (electronic energy included), which ends
+                up in the a6 coefficients
+                Cp/R = a1 + a2 T + a3 T^2 + a4 T^3 + a5 T^4
+                H/RT = a1 + a2 T/2 + a3 T^2/3 + a4 T^3/4 + a5 T^4/5 + a6/T
+                S/R  = a1 ln(T) + a2 T + a3 T^2/2 + a4 T^3/3 + a5 T^4/4 + a7'''
+import math
+import datetime
+import numpy as np
+try:
+    from . import constants as c
+    from .Gaussian_tools import ThermochemistryBatch
+except ImportError:
+    import constants as c
+    from Gaussian_tools import ThermochemistryBatch
+
+NASA_TEMPERATURE_LOW = 298.15   # K
+NASA_TEMPERATURE_MID = 1000.0   # K
+NASA_TEMPERATURE_HIGH = 2000.0  # K
+NUMBER_OF_POINTS = 100          # temperatures per range
+# the fit is done in T / TEMPERATURE_SCALE so that the powers of T stay of order 1
+TEMPERATURE_SCALE = 1000.0
+
+
+# rows of the Cp/R, H/RT and S/R terms of the 7 coefficients at every temperature (scaled), each of shape (n, 7)
+def get_nasa_basis(temperatures):
+    t = np.asarray(temperatures, dtype=float)[:, np.newaxis]
+    powers = np.arange(5)
+    zeros = np.zeros_like(t)
+    ones = np.ones_like(t)
+    cp_basis = np.hstack([t ** powers, zeros, zeros])
+    h_basis = np.hstack([t ** powers / (powers + 1), 1 / t, zeros])
+    s_basis = np.hstack([np.log(t), t ** powers[1:] / powers[1:], zeros, ones])
+    return cp_basis, h_basis, s_basis
+
+
+# Cp/R, H/RT and S/R of every species (columns) at temperatures (rows), all from one evaluation of the batch
+def get_thermo_grid(parsed_logs, masses_mobile_species, arguments, temperatures):
+    batch = ThermochemistryBatch(parsed_logs, temperatures, masses_mobile_species, arguments)
+    entropy, energy_thermal_corrections = batch.get_entropy_and_thermal_corrections()
+    energies = batch.get_energies(entropy, energy_thermal_corrections)
+    heat_capacity = batch.get_heat_capacity_cp(batch.get_heat_capacities())
+    R = c.R['J/K/mol']
+    return heat_capacity / R, energies['enthalpy'] / (R * batch.temperature_grid), sum(entropy.values()) / R
+
+
+# coefficients (number of species, 2, 7) of the low ([:, 0]) and high ([:, 1]) temperature ranges fitted to cp_R, h_RT
+# and s_R of shape (2 * number_of_points, number of species) on the grid returned by get_fit_temperatures.
+# Species with non finite data get nan coefficients
+def fit_nasa_coefficients(cp_R, h_RT, s_R, temperature_low = NASA_TEMPERATURE_LOW, temperature_mid = NASA_TEMPERATURE_MID,
+                          temperature_high = NASA_TEMPERATURE_HIGH, number_of_points = NUMBER_OF_POINTS):
+    temperatures = get_fit_temperatures(temperature_low, temperature_mid, temperature_high, number_of_points)
+    scaled_temperatures = temperatures / TEMPERATURE_SCALE
+    low_range = np.arange(temperatures.size) < number_of_points
+    # block diagonal design matrix: low range rows use coefficients 0-6, high range rows coefficients 7-13
+    design_matrix = []
+    for basis in get_nasa_basis(scaled_temperatures):
+        design_matrix.append(np.hstack([basis * low_range[:, np.newaxis], basis * ~low_range[:, np.newaxis]]))
+    design_matrix = np.vstack(design_matrix)
+    targets = np.vstack([cp_R, h_RT, s_R])
+    # continuity of Cp, H and S at the middle temperature: the coefficients are searched in the null space of the
+    # constraints, which turns the constrained fit into an ordinary least squares problem
+    constraints = np.vstack(get_nasa_basis([temperature_mid / TEMPERATURE_SCALE]))
+    constraints = np.hstack([constraints, -constraints])
+    null_space = np.linalg.svd(constraints)[2][constraints.shape[0]:].T
+    coefficients = np.full((targets.shape[1], 2, 7), np.nan)
+    finite_species = np.all(np.isfinite(targets), axis=0)
+    if np.any(finite_species):
+        solution = np.linalg.lstsq(design_matrix @ null_space, targets[:, finite_species], rcond=None)[0]
+        coefficients[finite_species] = (null_space @ solution).T.reshape(-1, 2, 7)
+    return unscale_coefficients(coefficients)
+
+
+# coefficients fitted in T / TEMPERATURE_SCALE -> coefficients in T (K)
+def unscale_coefficients(coefficients):
+    coefficients = coefficients.copy()
+    coefficients[..., 6] -= coefficients[..., 0] * math.log(TEMPERATURE_SCALE)
+    coefficients[..., :5] /= TEMPERATURE_SCALE ** np.arange(5)
+    coefficients[..., 5] *= TEMPERATURE_SCALE
+    return coefficients
+
+
+def get_fit_temperatures(temperature_low = NASA_TEMPERATURE_LOW, temperature_mid = NASA_TEMPERATURE_MID,
+                         temperature_high = NASA_TEMPERATURE_HIGH, number_of_points = NUMBER_OF_POINTS):
+    return np.concatenate([np.linspace(temperature_low, temperature_mid, number_of_points),
+                           np.linspace(temperature_mid, temperature_high, number_of_points)])
+
+
+# Cp/R, H/RT and S/R of every species (columns) at temperatures (rows) from the coefficients of fit_nasa_coefficients
+def evaluate_nasa(coefficients, temperatures, temperature_mid = NASA_TEMPERATURE_MID):
+    temperatures = np.asarray(temperatures, dtype=float)
+    results = []
+    for basis in get_nasa_basis(temperatures):
+        low_values = basis @ coefficients[:, 0].T
+        high_values = basis @ coefficients[:, 1].T
+        results.append(np.where(temperatures[:, np.newaxis] <= temperature_mid, low_values, high_values))
+    return tuple(results)
+
+
+# fit one group of species (arguments as fit_nasa_polynomials). Module level so that it can run in a worker process
+def fit_species_group(parsed_logs, masses_mobile_species, arguments, temperature_low, temperature_mid, temperature_high,
+                      number_of_points):
+    temperatures = get_fit_temperatures(temperature_low, temperature_mid, temperature_high, number_of_points)
+    cp_R, h_RT, s_R = get_thermo_grid(parsed_logs, masses_mobile_species, arguments, temperatures)
+    return fit_nasa_coefficients(cp_R, h_RT, s_R, temperature_low, temperature_mid, temperature_high, number_of_points)
+
+
+# NASA coefficients (number of species, 2, 7) of every species, arguments as for ThermochemistryBatch. The species are
+# split into groups fitted in parallel if workers > 1
+def fit_nasa_polynomials(parsed_logs, masses_mobile_species, arguments, temperature_low = NASA_TEMPERATURE_LOW,
+                         temperature_mid = NASA_TEMPERATURE_MID, temperature_high = NASA_TEMPERATURE_HIGH,
+                         number_of_points = NUMBER_OF_POINTS, workers = 1):
+    if not parsed_logs:
+        return np.empty((0, 2, 7))
+    number_of_groups = min(max(1, workers), len(parsed_logs))
+    groups = [slice(start, len(parsed_logs), number_of_groups) for start in range(number_of_groups)]
+    fit_arguments = [[parsed_logs[group], masses_mobile_species[group], arguments[group]] for group in groups]
+    ranges = [temperature_low, temperature_mid, temperature_high, number_of_points]
+    if number_of_groups > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=number_of_groups) as executor:
+            results = list(executor.map(fit_species_group, *zip(*[group_arguments + ranges
+                                                                 for group_arguments in fit_arguments])))
+    else:
+        results = [fit_species_group(*(fit_arguments[0] + ranges))]
+    coefficients = np.empty((len(parsed_logs), 2, 7))
+    for group, result in zip(groups, results):
+        coefficients[group] = result
+    return coefficients
+
+
+# Chemkin THERMO file with the coefficients of every species. phases: 'G' (gas) or 'S' (surface) per species. The element
+# columns are left empty since the composition is not read from the logs
+def write_chemkin_thermo(out_file, species_names, coefficients, phases, temperature_low = NASA_TEMPERATURE_LOW,
+                         temperature_mid = NASA_TEMPERATURE_MID, temperature_high = NASA_TEMPERATURE_HIGH):
+    date = datetime.datetime.now().strftime('%d%m%y')
+    with open(out_file, 'w') as fp:
+        fp.write('THERMO\n')
+        fp.write('{:10.3f}{:10.3f}{:10.3f}\n'.format(temperature_low, temperature_mid, temperature_high))
+        for name, species_coefficients, phase in zip(species_names, coefficients, phases):
+            low, high = species_coefficients
+            fp.write('{:<18}{:<6}{:<20}{:1}{:10.3f}{:10.3f}{:8.3f}{:6}1\n'.format(
+                name[:18], date, '', phase, temperature_low, temperature_high, temperature_mid, ''))
+            fp.write('{:15.8E}{:15.8E}{:15.8E}{:15.8E}{:15.8E}    2\n'.format(*high[:5]))
+            fp.write('{:15.8E}{:15.8E}{:15.8E}{:15.8E}{:15.8E}    3\n'.format(*(list(high[5:]) + list(low[:3]))))
+            fp.write('{:15.8E}{:15.8E}{:15.8E}{:15.8E}{:15}    4\n'.format(*(list(low[3:]) + [''])))
+        fp.write('END\n')
@@ -0,0 +1,208 @@
+'''@Author: Himaghna
+   Description: reaction and activation free energies, enthalpies and entropies and transition state theory rate constants
+                of a whole reaction network at once. The reactions are parsed into sparse stoichiometry matrices over the
+                species (named as in the tables of get_thermo_gaussian) so that the properties of every reaction at every
+                temperature are one sparse matrix product with the species properties, arrays of shape
+                (number of temperatures, number of species). scipy.sparse is used if installed, else numpy.
+                Reaction file: one reaction per line, '#' starts a comment
+                    [label:] A + 2 B -> C                   (no transition state)
+                    [label:] A + B -> TS1 -> C + D          (transition state TS1)'''
+import collections
+import numpy as np
+try:
+    from . import constants as c
+    from .thermo_errors import InvalidOptionError
+except ImportError:
+    import constants as c
+    from thermo_errors import InvalidOptionError
+
+# reactants and products: dictionaries species name -> stoichiometric coefficient. transition_state: name or None
+Reaction = collections.namedtuple('Reaction', ['label', 'reactants', 'products', 'transition_state'])
+PROPERTIES = ('gibbs_free_energy', 'enthalpy', 'entropy')
+
+
+# '2 A + B' -> {'A': 2.0, 'B': 1.0}. Terms are separated by ' + ' so that species names may hold '+' (e.g. ions)
+def parse_species_terms(text, line):
+    terms = dict()
+    for term in text.split(' + '):
+        words = term.split()
+        if len(words) == 2:
+            try:
+                coefficient = float(words[0])
+            except ValueError:
+                raise InvalidOptionError('invalid coefficient "{}" in reaction "{}"'.format(words[0], line))
+            name = words[1]
+        elif len(words) == 1:
+            coefficient, name = 1.0, words[0]
+        else:
+            raise InvalidOptionError('invalid term "{}" in reaction "{}"'.format(term.strip(), line))
+        terms[name] = terms.get(name, 0.0) + coefficient
+    return terms
+
+
+def parse_reaction(line, default_label = ''):
+    label, separator, equation = line.partition(':')
+    if not separator:
+        label, equation = default_label, line
+    sides = [side.strip() for side in equation.split('->')]
+    if len(sides) not in (2, 3) or not all(sides):
+        raise InvalidOptionError('reaction "{}" should read "A + B -> C" or "A + B -> TS -> C"'.format(line.strip()))
+    transition_state = None
+    if len(sides) == 3:
+        transition_state = sides[1]
+        if len(transition_state.split()) != 1:
+            raise InvalidOptionError('the transition state of reaction "{}" should be one species'.format(line.strip()))
+    return Reaction(label.strip(), parse_species_terms(sides[0], line), parse_species_terms(sides[-1], line),
+                    transition_state)
+
+
+# list of the Reactions of a reaction file. Unlabelled reactions are labelled R<line number>
+def read_reactions(reaction_file):
+    reactions = []
+    with open(reaction_file) as fp:
+        for line_number, line in enumerate(fp, 1):
+            line = line.split('#')[0].strip()
+            if line:
+                reactions.append(parse_reaction(line, 'R{}'.format(line_number)))
+    return reactions
+
+
+def format_reaction(reaction):
+    def format_side(terms):
+        return ' + '.join(name if coefficient == 1 else '{:g} {}'.format(coefficient, name)
+                          for name, coefficient in terms.items())
+    middle = ' -> {}'.format(reaction.transition_state) if reaction.transition_state else ''
+    return format_side(reaction.reactants) + middle + ' -> ' + format_side(reaction.products)
+
+
+# sparse matrix (number of reactions, number of species) of stoichiometric coefficients in coordinate form, sorted by
+# reaction
+class StoichiometryMatrix:
+    def __init__(self, reaction_indices, species_indices, coefficients, shape):
+        order = np.argsort(reaction_indices, kind='stable')
+        self.reaction_indices = np.asarray(reaction_indices, dtype=np.intp)[order]
+        self.species_indices = np.asarray(species_indices, dtype=np.intp)[order]
+        self.coefficients = np.asarray(coefficients, dtype=float)[order]
+        self.shape = shape
+        # reactions with any term and the start of their terms, for the numpy product
+        self.reactions, self.starts = np.unique(self.reaction_indices, return_index=True)
+        self.csr_matrix = None
+        try:
+            import scipy.sparse
+            self.csr_matrix = scipy.sparse.csr_matrix((self.coefficients, (self.reaction_indices, self.species_indices)),
+                                                      shape=shape)
+        except ImportError:
+            pass
+
+    # sum over species of coefficient * species_values for every reaction. species_values: array with the species
+    # along the last axis, e.g. (number of temperatures, number of species). Only the species of a reaction contribute,
+    # so nan values of species outside it do not propagate
+    def dot(self, species_values):
+        species_values = np.asarray(species_values, dtype=float)
+        if self.csr_matrix is not None:
+            flat_values = species_values.reshape(-1, species_values.shape[-1])
+            return np.asarray(self.csr_matrix @ flat_values.T).T.reshape(species_values.shape[:-1] + (self.shape[0],))
+        result = np.zeros(species_values.shape[:-1] + (self.shape[0],))
+        if self.coefficients.size:
+            terms = species_values[..., self.species_indices] * self.coefficients
+            result[..., self.reactions] = np.add.reduceat(terms, self.starts, axis=-1)
+        return result
+
+
+class ReactionNetwork:
+    # reactions: list of Reactions. species_names: names of the species in the order of the species axis of the
+    # property arrays passed to the methods
+    def __init__(self, reactions, species_names):
+        self.reactions = list(reactions)
+        self.species_names = list(species_names)
+        species_index = dict((name, index) for index, name in enumerate(self.species_names))
+        reaction_entries = ([], [], [])
+        activation_entries = ([], [], [])
+        self.has_transition_state = np.zeros(len(self.reactions), dtype=bool)
+        unknown_species = self.get_reaction_species(lambda species: species not in species_index)
+        if unknown_species:
+            raise InvalidOptionError('species not in the species table: ' + '; '.join(
+                '{} ({})'.format(label, ', '.join(names)) for label, names in unknown_species))
+        for index, reaction in enumerate(self.reactions):
+            terms = collections.Counter()
+            for name, coefficient in reaction.products.items():
+                terms[name] += coefficient
+            for name, coefficient in reaction.reactants.items():
+                terms[name] -= coefficient
+            add_entries(reaction_entries, index, terms, species_index)
+            if reaction.transition_state is not None:
+                self.has_transition_state[index] = True
+                terms = collections.Counter({reaction.transition_state: 1.0})
+                for name, coefficient in reaction.reactants.items():
+                    terms[name] -= coefficient
+                add_entries(activation_entries, index, terms, species_index)
+        shape = (len(self.reactions), len(self.species_names))
+        # products - reactants and transition state - reactants
+        self.reaction_matrix = StoichiometryMatrix(*reaction_entries, shape=shape)
+        self.activation_matrix = StoichiometryMatrix(*activation_entries, shape=shape)
+
+    # (label, names) of every reaction with species (reactants, products or transition state) for which
+    # is_selected(name) is True, e.g. species without data
+    def get_reaction_species(self, is_selected):
+        reaction_species = []
+        for reaction in self.reactions:
+            names = [name for name in list(reaction.reactants) + list(reaction.products) + [reaction.transition_state]
+                     if name is not None and is_selected(name)]
+            if names:
+                reaction_species.append((reaction.label or format_reaction(reaction), sorted(set(names))))
+        return reaction_species
+
+    # dictionary of the reaction Gibbs free energy, enthalpy (J/mol) and entropy (J/mol/K) of every reaction, arrays of
+    # shape (number of temperatures, number of reactions) from the species properties of shape (number of temperatures,
+    # number of species)
+    def get_reaction_properties(self, gibbs_free_energy, enthalpy, entropy):
+        return dict((name, self.reaction_matrix.dot(values)) for name, values in
+                    zip(PROPERTIES, [gibbs_free_energy, enthalpy, entropy]))
+
+    # as get_reaction_properties, transition state minus reactants. nan for reactions without transition state
+    def get_activation_properties(self, gibbs_free_energy, enthalpy, entropy):
+        properties = dict()
+        for name, values in zip(PROPERTIES, [gibbs_free_energy, enthalpy, entropy]):
+            properties[name] = np.where(self.has_transition_state, self.activation_matrix.dot(values), np.nan)
+        return properties
+
+
+def add_entries(entries, reaction_index, terms, species_index):
+    for name, coefficient in terms.items():
+        if coefficient != 0:
+            entries[0].append(reaction_index)
+            entries[1].append(species_index[name])
+            entries[2].append(coefficient)
+
+
+def get_temperature_column(temperatures):
+    return np.asarray(temperatures, dtype=float).reshape(-1, 1)
+
+
+# transition state theory rate constants k = kB T / h exp(-dG‡ / RT) (s-1 times the standard state of the species to the
+# power 1 - molecularity) of shape (number of temperatures, number of reactions)
+def get_rate_constants(temperatures, activation_gibbs_free_energy):
+    temperature = get_temperature_column(temperatures)
+    # far from equilibrium (or with absurd free energies) the exponentials under or overflow to 0 or inf
+    with np.errstate(over='ignore', under='ignore'):
+        return c.kBOLTZMANN_JOULE_PER_KELVIN * temperature / c.PLANK_CONSTANT_JOULE_SECOND * \
+            np.exp(-np.asarray(activation_gibbs_free_energy) / (c.R['J/K/mol'] * temperature))
+
+
+# equilibrium constants K = exp(-dG / RT) relative to the standard state of the species (e.g. the pressure of the gases)
+def get_equilibrium_constants(temperatures, reaction_gibbs_free_energy):
+    temperature = get_temperature_column(temperatures)
+    with np.errstate(over='ignore', under='ignore'):
+        return np.exp(-np.asarray(reaction_gibbs_free_energy) / (c.R['J/K/mol'] * temperature))
+
+
+# every property of every reaction at every temperature: dictionary of arrays (number of temperatures, number of
+# reactions) with the reaction properties, the activation properties (prefixed 'activation_'), the forward rate
+# constants and the equilibrium constants. The reverse rate constants are forward_rate_constant / equilibrium_constant
+def evaluate_network(network, temperatures, gibbs_free_energy, enthalpy, entropy):
+    results = network.get_reaction_properties(gibbs_free_energy, enthalpy, entropy)
+    for name, values in network.get_activation_properties(gibbs_free_energy, enthalpy, entropy).items():
+        results['activation_' + name] = values
+    results['forward_rate_constant'] = get_rate_constants(temperatures, results['activation_gibbs_free_energy'])
+    results['equilibrium_constant'] = get_equilibrium_constants(temperatures, results['gibbs_free_energy'])
+    return results
@@ -0,0 +1,163 @@
+'''@Author: Himaghna
+   Description: writers for tables of results that take one row at a time, so rows can be written from a generator as
+                species finish and memory stays bounded however long the table is. The format is chosen from the extension
+                of the output file: .xlsx (xlsxwriter in constant_memory mode), .csv, .parquet or .arrow (pyarrow, optional).
+                The conditions of a table (e.g. temperature and pressure) are written as label, value rows after the
+                rows of xlsx and csv tables and as schema metadata of parquet and arrow tables, whose rows stay typed'''
+import os
+import csv
+try:
+    from . import instrumentation
+    from .thermo_errors import InvalidOptionError
+except ImportError:
+    import instrumentation
+    from thermo_errors import InvalidOptionError
+
+WRITER_FORMATS = ('xlsx', 'csv', 'parquet', 'arrow')
+
+
+# conditions: list of (label, value) written as rows when the writer is closed
+class XlsxRowWriter:
+    def __init__(self, out_file, conditions = ()):
+        import xlsxwriter
+        # constant_memory flushes every row to disk once the next row is started
+        self.workbook = xlsxwriter.Workbook(out_file, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet()
+        self.row_number = 0
+        self.conditions = list(conditions)
+
+    def write_row(self, row):
+        self.worksheet.write_row(self.row_number, 0, tuple(row))
+        self.row_number += 1
+
+    def close(self):
+        for condition in self.conditions:
+            self.write_row(condition)
+        self.workbook.close()
+
+
+class CsvRowWriter:
+    def __init__(self, out_file, conditions = ()):
+        self.fp = open(out_file, 'w', newline='')
+        self.writer = csv.writer(self.fp)
+        self.conditions = list(conditions)
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        for condition in self.conditions:
+            self.write_row(condition)
+        self.fp.close()
+
+
+# Parquet or Arrow IPC file. The first row is the header. The type of every column (float64 if all its values are numbers,
+# else string) is fixed by the first batch of rows; empty cells and values not fitting the column type are written as null.
+# conditions: list of (label, value) stored as schema metadata (label without a trailing ':' -> value as text).
+# Raises ImportError if pyarrow is not installed
+class ArrowRowWriter:
+    def __init__(self, out_file, file_format = 'parquet', batch_size = 10000, conditions = ()):
+        try:
+            import pyarrow
+        except ImportError as error:
+            raise ImportError('pyarrow is required to write {} files'.format(file_format)) from error
+        self.pyarrow = pyarrow
+        self.out_file = out_file
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.header = None
+        self.schema = None
+        self.writer = None
+        self.rows = []
+        self.metadata = dict((str(label).rstrip(':'), str(value)) for label, value in conditions)
+
+    def write_row(self, row):
+        if self.header is None:
+            self.header = [str(name) for name in row]
+            return
+        self.rows.append(list(row))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def get_schema(self):
+        fields = []
+        for index, name in enumerate(self.header):
+            values = [row[index] for row in self.rows if index < len(row) and not row[index] == '']
+            if values and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                fields.append(self.pyarrow.field(name, self.pyarrow.float64()))
+            else:
+                fields.append(self.pyarrow.field(name, self.pyarrow.string()))
+        return self.pyarrow.schema(fields, metadata=self.metadata or None)
+
+    def flush(self):
+        if self.header is None:
+            return
+        if self.schema is None:
+            self.schema = self.get_schema()
+            if self.file_format == 'parquet':
+                import pyarrow.parquet
+                self.writer = pyarrow.parquet.ParquetWriter(self.out_file, self.schema)
+            else:
+                import pyarrow.ipc
+                self.writer = pyarrow.ipc.new_file(self.out_file, self.schema)
+        columns = []
+        for index, field in enumerate(self.schema):
+            column = []
+            for row in self.rows:
+                value = row[index] if index < len(row) else None
+                if value == '':
+                    value = None
+                elif field.type == self.pyarrow.float64():
+                    value = float(value) if isinstance(value, (int, float)) else None
+                elif value is not None:
+                    value = str(value)
+                column.append(value)
+            columns.append(self.pyarrow.array(column, type=field.type))
+        self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+# writer timing the rows written and the close of another writer as the stage 'write:<format>' (see instrumentation)
+class TimedRowWriter:
+    def __init__(self, writer, file_format):
+        self.writer = writer
+        self.stage_name = 'write:' + file_format
+
+    def write_row(self, row):
+        with instrumentation.stage(self.stage_name):
+            self.writer.write_row(row)
+
+    def close(self):
+        with instrumentation.stage(self.stage_name):
+            self.writer.close()
+
+
+# writer for out_file, chosen by its extension (see WRITER_FORMATS). conditions: list of (label, value) of the table,
+# e.g. [('Temperature:', 300)]. Timed if instrumentation is enabled. Raises InvalidOptionError for other extensions
+def open_row_writer(out_file, conditions = ()):
+    file_format = os.path.splitext(out_file)[1].lstrip('.').lower()
+    if file_format == 'xlsx':
+        writer = XlsxRowWriter(out_file, conditions)
+    elif file_format == 'csv':
+        writer = CsvRowWriter(out_file, conditions)
+    elif file_format in ['parquet', 'arrow']:
+        writer = ArrowRowWriter(out_file, file_format=file_format, conditions=conditions)
+    else:
+        raise InvalidOptionError('output file {} should have one of the extensions {}'.format(out_file, WRITER_FORMATS))
+    return TimedRowWriter(writer, file_format) if instrumentation.is_enabled() else writer
+
+
+# write every row of an iterable (e.g. a generator) to out_file without holding the rows in memory. conditions: see
+# open_row_writer
+def write_rows(out_file, rows, conditions = ()):
+    writer = open_row_writer(out_file, conditions)
+    try:
+        for row in rows:
+            writer.write_row(row)
+    finally:
+        writer.close()
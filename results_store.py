@@ -0,0 +1,142 @@
+'''@Author: Himaghna
+   Description: SQLite store of the thermochemistry results of every species at every condition (temperature, pressure)
+                and set of model options, with the size, modification time and (if known) hash of the log file they
+                were computed from. Indexed by species and condition so that downstream tools can look up G(T, P) of a
+                species or query ranges of conditions without reopening the tables, and so that results already
+                computed for an unchanged log are reused.
+                Energies in J/mol, entropies in J/mol/K
+   Call type: results_store.py results.sqlite -s CH4 -t 300 500 -p 101325'''
+import os
+import json
+import sqlite3
+import argparse
+try:
+    from .log_cache import get_file_hash
+except ImportError:
+    from log_cache import get_file_hash
+
+RESULTS_FILE_NAME = '.thermo_results.sqlite'
+# names of the stored values, in the order of the columns
+RESULT_VALUES = ('gibbs_free_energy', 'enthalpy', 'entropy', 'electronic_energy', 'zero_point_energy')
+# conditions closer than this (K or Pa) are the same condition
+CONDITION_TOLERANCE = 1e-6
+COLUMNS = ('species', 'path', 'temperature', 'pressure', 'options') + RESULT_VALUES + ('content_hash', 'size', 'mtime_ns')
+
+
+# model options (e.g. apply_qrrho, rotation, translation, job) as stored: json with sorted keys
+def get_options_key(options):
+    return json.dumps(options, sort_keys=True)
+
+
+class ResultsStore:
+    def __init__(self, store_file):
+        self.store_file = store_file
+        self.hits = 0
+        self.misses = 0
+        # generous timeout and write ahead logging as several processes may share one store
+        self.connection = sqlite3.connect(store_file, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results (species TEXT, path TEXT, temperature REAL, '
+                                'pressure REAL, options TEXT, {}, content_hash TEXT, size INTEGER, mtime_ns INTEGER, '
+                                'PRIMARY KEY (path, options, temperature, pressure))'
+                                .format(', '.join(name + ' REAL' for name in RESULT_VALUES)))
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_by_condition ON results (species, temperature, '
+                                'pressure)')
+        self.connection.commit()
+
+    # stored values (dictionary of RESULT_VALUES) of log_file at a condition with options, or None if there are none or
+    # the log changed since they were stored. The log is only hashed if its size is the same but not its modification
+    # time, which is then updated for all results of the log if the hash did not change (e.g. the log was touched).
+    # Results stored without a hash are then taken as changed
+    def get_values(self, log_file, temperature, pressure, options):
+        path = os.path.abspath(log_file)
+        row = self.connection.execute(
+            'SELECT {}, content_hash, size, mtime_ns FROM results WHERE path = ? AND options = ? AND temperature '
+            'BETWEEN ? AND ? AND pressure BETWEEN ? AND ?'.format(', '.join(RESULT_VALUES)),
+            (path, get_options_key(options), temperature - CONDITION_TOLERANCE, temperature + CONDITION_TOLERANCE,
+             pressure - CONDITION_TOLERANCE, pressure + CONDITION_TOLERANCE)).fetchone()
+        if row is not None:
+            content_hash, size, mtime_ns = row[len(RESULT_VALUES):]
+            stat = os.stat(path)
+            if size == stat.st_size and mtime_ns != stat.st_mtime_ns and content_hash is not None and \
+                    content_hash == get_file_hash(path):
+                self.connection.execute('UPDATE results SET mtime_ns = ? WHERE path = ? AND content_hash = ?',
+                                        (stat.st_mtime_ns, path, content_hash))
+                self.connection.commit()
+                mtime_ns = stat.st_mtime_ns
+            if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                self.hits += 1
+                return dict(zip(RESULT_VALUES, row[:len(RESULT_VALUES)]))
+        self.misses += 1
+        return None
+
+    # values: dictionary of RESULT_VALUES. Replaces the result of the log at the same condition and options. Call commit
+    # once a batch of results is stored. content_hash: hash of the log (see log_cache.get_file_hash) if already known,
+    # e.g. from a LogCache with use_hash. The log is not read to hash it, its size and modification time identify it
+    def store_values(self, log_file, species, temperature, pressure, options, values, content_hash = None):
+        path = os.path.abspath(log_file)
+        stat = os.stat(path)
+        self.connection.execute('DELETE FROM results WHERE path = ? AND options = ? AND temperature BETWEEN ? AND ? AND '
+                                'pressure BETWEEN ? AND ?',
+                                (path, get_options_key(options), temperature - CONDITION_TOLERANCE,
+                                 temperature + CONDITION_TOLERANCE, pressure - CONDITION_TOLERANCE,
+                                 pressure + CONDITION_TOLERANCE))
+        self.connection.execute('INSERT INTO results VALUES ({})'.format(', '.join('?' * len(COLUMNS))),
+                                [species, path, temperature, pressure, get_options_key(options)] +
+                                [values[name] for name in RESULT_VALUES] +
+                                [content_hash, stat.st_size, stat.st_mtime_ns])
+
+    def commit(self):
+        self.connection.commit()
+
+    # stored results (dictionaries of COLUMNS, options decoded) matching every given criterion, sorted by species,
+    # temperature and pressure. temperature_range and pressure_range: (lowest, highest), bounds included
+    def query(self, species = None, temperature_range = None, pressure_range = None, options = None):
+        conditions = []
+        parameters = []
+        if species is not None:
+            conditions.append('species = ?')
+            parameters.append(species)
+        for name, value_range in [('temperature', temperature_range), ('pressure', pressure_range)]:
+            if value_range is not None:
+                conditions.append('{} BETWEEN ? AND ?'.format(name))
+                parameters.extend([value_range[0] - CONDITION_TOLERANCE, value_range[1] + CONDITION_TOLERANCE])
+        if options is not None:
+            conditions.append('options = ?')
+            parameters.append(get_options_key(options))
+        rows = self.connection.execute('SELECT {} FROM results {} ORDER BY species, temperature, pressure'.format(
+            ', '.join(COLUMNS), 'WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters).fetchall()
+        results = [dict(zip(COLUMNS, row)) for row in rows]
+        for result in results:
+            result['options'] = json.loads(result['options'])
+        return results
+
+    # results of species at one condition (one per set of options)
+    def lookup(self, species, temperature, pressure, options = None):
+        return self.query(species, (temperature, temperature), (pressure, pressure), options)
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a store of thermochemistry results')
+    parser.add_argument('store_file', help='Results store written by get_thermo_gaussian.py --store')
+    parser.add_argument('-s', '--species', default=None, help='Name of the species (log file name without extension)')
+    parser.add_argument('-t', '--temperature', type=float, nargs='+', default=None, metavar='K',
+                        help='Temperature, or lowest and highest temperature (K)')
+    parser.add_argument('-p', '--pressure', type=float, nargs='+', default=None, metavar='PA',
+                        help='Pressure, or lowest and highest pressure (Pa)')
+    command_args = parser.parse_args()
+    store = ResultsStore(command_args.store_file)
+    temperature_range = command_args.temperature and (command_args.temperature[0], command_args.temperature[-1])
+    pressure_range = command_args.pressure and (command_args.pressure[0], command_args.pressure[-1])
+    print('\t'.join(('species', 'temperature', 'pressure') + RESULT_VALUES + ('options',)))
+    for result in store.query(command_args.species, temperature_range, pressure_range):
+        print('\t'.join(str(result[name]) for name in ('species', 'temperature', 'pressure') + RESULT_VALUES) + '\t' +
+              get_options_key(result['options']))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
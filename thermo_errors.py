@@ -0,0 +1,37 @@
+'''@Author: Himaghna
+   Description: exceptions raised by the log readers and the thermochemistry classes instead of exiting, so that a bad log
+                can be reported and skipped by the caller (e.g. a batch running in a pool of worker processes).
+                Catch ThermochemistryError for all of them'''
+
+
+class ThermochemistryError(Exception):
+    pass
+
+
+# the log file does not exist or cannot be read or parsed
+class InvalidLogError(ThermochemistryError):
+    def __init__(self, log_file, message):
+        super().__init__('{}: {}'.format(log_file, message))
+        self.log_file = log_file
+        self.message = message
+
+    # pickled with the constructor arguments so that the error can be sent back from a worker process
+    def __reduce__(self):
+        return type(self), (self.log_file, self.message)
+
+
+# a quantity needed for the requested thermochemistry is absent from (or unusable in) the log file
+class MissingDataError(ThermochemistryError):
+    def __init__(self, log_file, quantity, message = 'not found in log file'):
+        super().__init__('{}: {} {}'.format(log_file, quantity, message))
+        self.log_file = log_file
+        self.quantity = quantity
+        self.message = message
+
+    def __reduce__(self):
+        return type(self), (self.log_file, self.quantity, self.message)
+
+
+# invalid argument (e.g. translation not 0, 1, 2 or 3). Also a ValueError
+class InvalidOptionError(ThermochemistryError, ValueError):
+    pass
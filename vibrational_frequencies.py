@@ -1,32 +1,48 @@
-
-import xlsxwriter
-
 ''' Author: Himaghna Bhattacharjee
     Date: March 2018
-    Description: This code take in an input Gaussian log file and exports an Excel file with all vibrational frequencies listed as a single column '''
-
-column = 1
-filename = input("\nEnter filename: ")
-
-output_filename = filename.split('.')[0]+'frequencies.xlsx'
+    Description: This code take in an input Gaussian log file and exports an Excel file with all vibrational frequencies listed as a single column
+    Call type: vibrational_frequencies.py "logfilename".log (asked for if not given) '''
+import argparse
 try:
-    workbook = xlsxwriter.Workbook(output_filename)
-    worksheet = workbook.add_worksheet()
+    from .Gaussian_log import open_log
+except ImportError:
+    from Gaussian_log import open_log
 
-except:
-    print('Error with opening output file. Exiting')
-    exit()
-frequencies = []
-try:
-    with open(filename) as fp:
+
+# all frequencies (cm-1) listed in the log file (plain or compressed)
+def get_frequencies(filename):
+    frequencies = []
+    with open_log(filename, text=True) as fp:
         for line in fp:
             if "Frequencies" in line.strip("\n"):
                 for cell in line.split():
                     if not cell == "Frequencies" and not cell == '--':
                         frequencies.append(float(cell))
-except:
-    print("no Filename passed")
-    exit()
-worksheet.write_row('A1', frequencies)
+    return frequencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the vibrational frequencies of a Gaussian log file to Excel')
+    parser.add_argument('filename', nargs='?', default=None, help='Gaussian log file')
+    filename = parser.parse_args().filename or input("\nEnter filename: ")
+
+    import xlsxwriter
+    output_filename = filename.split('.')[0]+'frequencies.xlsx'
+    try:
+        workbook = xlsxwriter.Workbook(output_filename)
+        worksheet = workbook.add_worksheet()
+
+    except:
+        print('Error with opening output file. Exiting')
+        exit()
+    try:
+        frequencies = get_frequencies(filename)
+    except:
+        print("no Filename passed")
+        exit()
+    worksheet.write_row('A1', frequencies)
+    workbook.close()
 
 
+if __name__ == '__main__':
+    main()